@@ -1,12 +1,70 @@
+import asyncio
 from abc import abstractmethod, ABC
-from typing import List, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from tools import ContactCrawler
 
 
 class AbstractParseService(ABC):
+    checkpoint: Optional[CheckpointStore] = None
+    index: Optional[ExhibitorIndex] = None
+    crawler: Optional[ContactCrawler] = None
+
     @abstractmethod
-    async def parse(self) -> List:
+    def stream(self) -> AsyncIterator[List]:
         pass
 
+    async def parse(self) -> List:
+        return [row async for row in self.stream()]
+
     @abstractmethod
     def get_parsed_data_names(self) -> Tuple:
         pass
+
+    @staticmethod
+    async def _yield_as_completed(rows: Iterable[Awaitable[List]]) -> AsyncIterator[List]:
+        tasks: list = [asyncio.ensure_future(row) for row in rows]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def _yield_pipelined(
+            parse: Callable[[Any], Awaitable[List]], pages: Iterable[Awaitable[List]], items: Iterable = ()
+    ) -> AsyncIterator[List]:
+        # Items of a listing page are parsed as soon as that page arrives, while the other pages are still loading
+        completed: asyncio.Queue = asyncio.Queue()
+        tasks: set = set()
+
+        def schedule(awaitable: Awaitable, is_page: bool) -> None:
+            task: asyncio.Future = asyncio.ensure_future(awaitable)
+            task.add_done_callback(lambda _: completed.put_nowait((is_page, task)))
+            tasks.add(task)
+
+        for page in pages:
+            schedule(page, is_page=True)
+        for item in items:
+            schedule(parse(item), is_page=False)
+
+        try:
+            while tasks:
+                is_page, task = await completed.get()
+                tasks.discard(task)
+                if not is_page:
+                    yield task.result()
+                    continue
+                for item in task.result():
+                    schedule(parse(item), is_page=False)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _checkpoint(self, stage: str, key: Any, factory: Callable[[], Awaitable]) -> Any:
+        if self.checkpoint is None:
+            return await factory()
+        return await self.checkpoint.load(stage, key, factory)
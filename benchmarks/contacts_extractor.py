@@ -0,0 +1,73 @@
+import argparse
+import pathlib
+import re
+import time
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+from extractors import extract_contacts
+
+
+def extract_contacts_with_beautifulsoup(content: bytes) -> Dict[str, List]:
+    soup = BeautifulSoup(content, "lxml")
+    email_pattern = re.compile(r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4})")
+    phone_pattern = re.compile(r"\+?\d{1,3}\s?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{2}[-.\s]?\d{2}")
+    return {
+        "emails": list(set(re.findall(email_pattern, soup.get_text()))),
+        "phones": list(set(re.findall(phone_pattern, soup.get_text()))),
+    }
+
+
+def build_corpus(page_size: int) -> Dict[str, bytes]:
+    # Markup-heavy pages are mostly tags, text-heavy ones are long prose where every word is a regex start
+    row: str = '<div class="item"><span class="label">Hall</span><a href="/stand/{i}">Stand {i}</a></div>'
+    sentence: str = "Our company has been manufacturing packaging machines since 1985 and ships them. "
+    paragraph: str = "<p>" + sentence * 8 + "</p>"
+    contacts: str = '<a href="mailto:info@example.com">Mail</a> <a href="tel:+34 600 000 000">Call</a>'
+    markup: str = "".join(row.format(i=i) for i in range(page_size // len(row)))
+    text: str = paragraph * max(page_size // len(paragraph), 1)
+    return {
+        "markup-heavy.html": f"<html><body>{markup}{contacts}</body></html>".encode("utf-8"),
+        "text-heavy.html": f"<html><body>{text}{contacts}</body></html>".encode("utf-8"),
+    }
+
+
+def measure(extractor: Callable[[bytes], Dict[str, List]], pages: List[bytes], repeat: int) -> float:
+    started_at: float = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            extractor(page)
+    return len(pages) * repeat / (time.perf_counter() - started_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare contact extraction throughput on a saved HTML corpus")
+    parser.add_argument("corpus", type=pathlib.Path, nargs="?", help="directory with saved *.html pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=200 * 1024, help="size of the generated pages in bytes")
+    args = parser.parse_args()
+
+    # The generated pages are always measured, a saved corpus alone can hide one of the two page shapes
+    generated: Dict[str, bytes] = build_corpus(args.page_size)
+    for name, page in generated.items():
+        beautifulsoup_speed: float = measure(extract_contacts_with_beautifulsoup, [page], args.repeat)
+        bytes_speed: float = measure(extract_contacts, [page], args.repeat)
+        print(f"{name}: BeautifulSoup {beautifulsoup_speed:.1f} pages/s, byte-level {bytes_speed:.1f} pages/s "
+              f"({bytes_speed / beautifulsoup_speed:.1f}x)")
+    if args.corpus is None:
+        return
+
+    pages: List[bytes] = [path.read_bytes() for path in sorted(args.corpus.rglob("*.htm*"))]
+    if not pages:
+        parser.error(f"No HTML pages found in {args.corpus}")
+
+    print(f"Pages: {len(pages)} Size: {sum(len(page) for page in pages) / 1024 / 1024:.1f} MiB")
+    beautifulsoup_speed: float = measure(extract_contacts_with_beautifulsoup, pages, args.repeat)
+    print(f"BeautifulSoup get_text + regex: {beautifulsoup_speed:.1f} pages/s")
+    bytes_speed: float = measure(extract_contacts, pages, args.repeat)
+    print(f"Byte-level extractor: {bytes_speed:.1f} pages/s ({bytes_speed / beautifulsoup_speed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
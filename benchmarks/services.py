@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import resource
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qs
+
+from aiohttp import web
+
+from abstract import AbstractParseService
+from cantonfair.service import CantonfairParseService
+from eccmid.service import EccmidParseService
+from firabarcelona.service import FiraBarcelonaParseService
+from http_client import HttpClient
+from ifema.service import IFemaParseService
+from mwcbarcelona.service import MVCBarcelonaParseService
+from parsing_pool import shutdown_parsing_pool, start_parsing_pool
+from publicalt.service import PublicaltParseService
+from services import WhatsappService
+from ticketsnebext.service import TicketsNebextParseService
+from tools import cancel_website_lookups
+
+HOST: str = "127.0.0.1"
+PORT: int = 8765
+LISTING_ROUTE_PREFIX: str = "listing:"
+COUNTRIES: Tuple = (("ES", "Spain"), ("DE", "Germany"), ("CN", "China"), ("FR", "France"), ("IT", "Italy"))
+
+
+class StandInFixtures(object):
+    def __init__(self, base_url: str, exhibitors: int, page_size: int):
+        self.base_url: str = base_url
+        self.exhibitors: int = exhibitors
+        self.page_size: int = page_size
+
+    def country(self, i: int) -> Tuple[str, str]:
+        return COUNTRIES[i % len(COUNTRIES)]
+
+    def phone(self, i: int) -> str:
+        return f"6{i:08d}"[-9:]
+
+    def email(self, i: int) -> str:
+        return f"info{i}@exhibitor{i}.com"
+
+    def website(self, i: int) -> str:
+        # Every tenth exhibitor shares a website with its neighbour, as groups of companies do on real fairs
+        return f"{self.base_url}/sites/{i - i % 10 if i % 10 == 9 else i}"
+
+    def page(self, items: int, page: int, size: int) -> range:
+        return range(min(page * size, items), min((page + 1) * size, items))
+
+    def website_html(self, i: int) -> bytes:
+        filler: str = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 16 + "</p>"
+        body: str = (
+            f"<html><head><title>Exhibitor {i}</title><script>var x = 'a@b.png';</script></head><body>"
+            f"<h1>Exhibitor {i}</h1>{filler * max(self.page_size // len(filler), 1)}"
+            f'<a href="mailto:{self.email(i)}">Mail</a> <a href="tel:+34 {self.phone(i)}">Call</a>'
+            f'<a href="https://www.linkedin.com/company/exhibitor{i}">LinkedIn</a></body></html>'
+        )
+        return body.encode("utf-8")
+
+    def cantonfair_page(self, page: int, size: int) -> Dict:
+        total_pages: int = self.exhibitors // size + (1 if self.exhibitors % size else 0)
+        shops: list = [{"code": f"shop{i}"} for i in self.page(self.exhibitors, page, size)]
+        return {"arrayData": {"0": {
+            "_embedded": {"b2b:shops": shops},
+            "page": {"totalPages": total_pages, "totalElements": self.exhibitors},
+        }}}
+
+    def cantonfair_detail(self, code: str) -> Dict:
+        i: int = int(code.removeprefix("shop"))
+        country_code, country_name = self.country(i)
+        return {"arrayData": {"0": {
+            "name": f"Exhibitor {i}",
+            "address": {"country": {"name": country_name, "code": country_code}, "fullAddress": f"Street {i}"},
+            "udfs": {
+                "email": self.email(i), "mobilePhone": "13" + self.phone(i), "telephone": "020-" + self.phone(i)[:7],
+                "contactPerson": f"Person {i}", "fax": None, "website": self.website(i), "typeOfCompany": "Factory",
+                "mainProducts": "Goods", "zipCode": f"{i:05d}",
+            },
+            "subsite": "canton", "businessType": "Manufacturer", "status": "ACTIVE",
+        }}}
+
+    def fira_detail(self, i: int) -> Dict:
+        return {
+            "id": i, "name": f"Exhibitor {i}", "countryId": i % len(COUNTRIES), "contactTelephone": self.phone(i),
+            "telephone": "9" + self.phone(i)[1:], "contactEmail": self.email(i), "email": self.email(i),
+            "contactName": f"Person {i}", "contactPost": "CEO", "webSite": self.website(i), "facebookUrl": None,
+        }
+
+    def ifema_detail(self, i: int) -> Dict:
+        return {"name": f"Exhibitor {i}", "location": {"countryCode": self.country(i)[0]}, "link": self.website(i)}
+
+    def algolia_result(self, page: int, size: int) -> Dict:
+        pages: int = self.exhibitors // size + (1 if self.exhibitors % size else 0)
+        hits: list = [
+            {"objectID": str(i), "name": f"Exhibitor {i}", "country": self.country(i)[1], "url": f"/exhibitors/{i}"}
+            for i in self.page(self.exhibitors, page, size)
+        ]
+        return {"hits": hits, "nbPages": pages, "page": page}
+
+    def mwc_html(self, i: int) -> bytes:
+        return (
+            f'<html><body><div id="exhibitor-container"><aside><div><ul>'
+            f'<li><a href="tel:{self.phone(i)}">Phone</a></li><li><a href="mailto:{self.email(i)}">Mail</a></li>'
+            f'<li><a href="{self.website(i)}">Website</a></li></ul></div></aside></div></body></html>'
+        ).encode("utf-8")
+
+    def xeria_data(self) -> Dict:
+        return {"Data": [
+            {
+                "Name": f"Exhibitor {i}", "Web": self.website(i), "Email": self.email(i), "Telephone": self.phone(i),
+                "Country": self.country(i)[1], "IdAccount": i,
+            } for i in range(self.exhibitors)
+        ]}
+
+    def eccmid_html(self) -> bytes:
+        links: str = "".join(
+            f'<a class="linksside" href="{self.website(i)}">Exhibitor {i}</a>' for i in range(self.exhibitors)
+        )
+        return f"<html><body>{links}</body></html>".encode("utf-8")
+
+
+def create_app(fixtures: StandInFixtures, latency: float, error_rate: float, seed: int) -> web.Application:
+    randomizer = random.Random(seed)
+
+    @web.middleware
+    async def inject_faults(request: web.Request, handler: Callable) -> web.StreamResponse:
+        if latency:
+            await asyncio.sleep(randomizer.expovariate(1 / latency))
+        # Listing pages are left alone, a single lost page would only measure how a service gives up
+        route_name: str = request.match_info.route.name or ""
+        if not route_name.startswith(LISTING_ROUTE_PREFIX) and randomizer.random() < error_rate:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return await handler(request)
+
+    async def website(request: web.Request) -> web.Response:
+        return web.Response(body=fixtures.website_html(int(request.match_info["i"])), content_type="text/html")
+
+    async def check_whatsapp(request: web.Request) -> web.Response:
+        phone_number: str = (await request.json())["phoneNumber"]
+        return web.json_response({"existsWhatsapp": int(phone_number[-1]) % 2 == 0})
+
+    async def cantonfair_page(request: web.Request) -> web.Response:
+        page, size = int(request.query["page"]), int(request.query["size"])
+        return web.json_response(fixtures.cantonfair_page(page, size))
+
+    async def cantonfair_detail(request: web.Request) -> web.Response:
+        return web.json_response(fixtures.cantonfair_detail(request.query["shopCode"]))
+
+    async def fira_countries(request: web.Request) -> web.Response:
+        countries: list = [{"id": i, "name": name} for i, (_, name) in enumerate(COUNTRIES)]
+        return web.json_response({"_embedded": {"countries": countries}})
+
+    async def fira_count(request: web.Request) -> web.Response:
+        return web.json_response({"EXHIBITORS": fixtures.exhibitors})
+
+    async def fira_search(request: web.Request) -> web.Response:
+        page, size = int(request.query["page"]), int(request.query["size"])
+        return web.json_response({"list": [{"entityId": i} for i in fixtures.page(fixtures.exhibitors, page, size)]})
+
+    async def fira_detail(request: web.Request) -> web.Response:
+        return web.json_response(fixtures.fira_detail(int(request.match_info["i"])))
+
+    async def ifema_search(request: web.Request) -> web.Response:
+        data: Dict = await request.json()
+        pages: range = fixtures.page(fixtures.exhibitors, data["page"], data["pageSize"])
+        return web.json_response({"data": [{"id": str(i), "email": fixtures.email(i)} for i in pages]})
+
+    async def ifema_detail(request: web.Request) -> web.Response:
+        return web.json_response(fixtures.ifema_detail(int(request.match_info["i"])))
+
+    async def algolia_queries(request: web.Request) -> web.Response:
+        results: list = []
+        for query in json.loads(await request.text())["requests"]:
+            params: Dict = parse_qs(query["params"])
+            results.append(fixtures.algolia_result(int(params["page"][0]), int(params["hitsPerPage"][0])))
+        return web.json_response({"results": results})
+
+    async def mwc_detail(request: web.Request) -> web.Response:
+        return web.Response(body=fixtures.mwc_html(int(request.match_info["i"])), content_type="text/html")
+
+    async def xeria_companies(request: web.Request) -> web.Response:
+        return web.json_response(fixtures.xeria_data())
+
+    async def eccmid_listing(request: web.Request) -> web.Response:
+        return web.Response(body=fixtures.eccmid_html(), content_type="text/html")
+
+    app = web.Application(middlewares=[inject_faults])
+    app.router.add_get("/sites/{i}", website)
+    app.router.add_post("/green/waInstance{instance}/checkWhatsapp/{token}", check_whatsapp)
+    app.router.add_get(
+        "/cantonfair/b2bshop/api/themeRos/public/productShops/searchByVariables", cantonfair_page,
+        name=LISTING_ROUTE_PREFIX + "cantonfair",
+    )
+    app.router.add_get("/cantonfair/b2bshop/api/themeRos/public/shopExt/searchByVariables", cantonfair_detail)
+    app.router.add_get(
+        "/fira/catalogues/{catalog}/countriesInUse", fira_countries, name=LISTING_ROUTE_PREFIX + "fira-countries"
+    )
+    app.router.add_get("/fira/catalogues/{catalog}/countItems", fira_count, name=LISTING_ROUTE_PREFIX + "fira-count")
+    app.router.add_post("/fira-search/us/unifiedSearch", fira_search, name=LISTING_ROUTE_PREFIX + "fira-search")
+    app.router.add_get("/fira/exhibitors/{i}", fira_detail)
+    app.router.add_post(
+        "/ifema/tenants/{tenant}/editions/{edition}/exhibitors/search", ifema_search,
+        name=LISTING_ROUTE_PREFIX + "ifema",
+    )
+    app.router.add_get("/ifema/tenants/{tenant}/editions/{edition}/exhibitors/{i}", ifema_detail)
+    app.router.add_post("/algolia/1/indexes/{index}/queries", algolia_queries, name=LISTING_ROUTE_PREFIX + "algolia")
+    app.router.add_get("/mwc/exhibitors/{i}", mwc_detail)
+    app.router.add_post(
+        "/publicalt/{catalog}/es/Company/Companies_Read", xeria_companies, name=LISTING_ROUTE_PREFIX + "publicalt"
+    )
+    app.router.add_post(
+        "/ticketsnebext/{catalog}/en/Company/Companies_Read", xeria_companies,
+        name=LISTING_ROUTE_PREFIX + "ticketsnebext",
+    )
+    app.router.add_get("/eccmid", eccmid_listing, name=LISTING_ROUTE_PREFIX + "eccmid")
+    return app
+
+
+def serve(port: int, exhibitors: int, page_size: int, latency: float, error_rate: float, seed: int) -> None:
+    base_url: str = f"http://{HOST}:{port}"
+    app: web.Application = create_app(StandInFixtures(base_url, exhibitors, page_size), latency, error_rate, seed)
+    web.run_app(app, host=HOST, port=port, print=None, access_log=None)
+
+
+def stand_in(service: type, **attributes: Any) -> type:
+    # Base URLs are class attributes, a subclass points a service at the stand-in without touching its code
+    return type(service.__name__, (service,), attributes)
+
+
+def create_services(
+        base_url: str, whatsapp: WhatsappService, client: HttpClient
+) -> Dict[str, Callable[[], AbstractParseService]]:
+    return {
+        "cantonfair": lambda: stand_in(CantonfairParseService, Cantonfair_API_URL=base_url + "/cantonfair")(
+            "auth", whatsapp, client
+        ),
+        "eccmid": lambda: stand_in(EccmidParseService, Eccmid_URL=base_url + "/eccmid")(whatsapp, client),
+        "firabarcelona": lambda: stand_in(
+            FiraBarcelonaParseService,
+            ECatalogue_SEARCH_API_URL=base_url + "/fira-search",
+            ECatalogue_DETAIL_API_URL=base_url + "/fira",
+        )("J000000", 1, "benchmark", whatsapp, client),
+        "ifema": lambda: stand_in(IFemaParseService, IFema_API_URL=base_url + "/ifema")(
+            "tenant", "edition", whatsapp, client
+        ),
+        "mwcbarcelona": lambda: stand_in(
+            MVCBarcelonaParseService, ALGOLIA_API_URl=base_url + "/algolia/", MVCBarcelona_URL=base_url + "/mwc/"
+        )("key", "application", whatsapp, client),
+        "publicalt": lambda: stand_in(PublicaltParseService, Publicalt_URL=base_url + "/publicalt/")(
+            "benchmark", whatsapp, client
+        ),
+        "ticketsnebext": lambda: stand_in(TicketsNebextParseService, TicketsNebext_API_URL=base_url + "/ticketsnebext")(
+            "benchmark", whatsapp, client
+        ),
+    }
+
+
+async def run_service(name: str, base_url: str) -> Dict[str, Any]:
+    async with stand_in(HttpClient, RETRY_BACKOFF=0.01)() as client:
+        whatsapp: WhatsappService = stand_in(WhatsappService, Green_API_URL=base_url + "/green/")(
+            1, "token", client, requests_per_second=1000
+        )
+        service: AbstractParseService = create_services(base_url, whatsapp, client)[name]()
+        started_at: float = time.perf_counter()
+        rows: int = 0
+        try:
+            async for _ in service.stream():
+                rows += 1
+        finally:
+            whatsapp.close()
+            cancel_website_lookups(client)
+        elapsed: float = time.perf_counter() - started_at
+
+    requests: Dict[str, Dict[str, int]] = {}
+    for metrics in client.metrics.to_dict()["requests"]:
+        requests[metrics["stage"]] = {
+            key: metrics[key] for key in ("requests", "retries", "timeouts", "errors", "bytes")
+        }
+    return {
+        "service": name,
+        "exhibitors": rows,
+        "seconds": round(elapsed, 3),
+        "exhibitors_per_second": round(rows / elapsed, 1) if elapsed else 0,
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "requests": requests,
+    }
+
+
+def run_service_in_process(name: str, base_url: str) -> Dict[str, Any]:
+    try:
+        start_parsing_pool()
+        return asyncio.run(run_service(name, base_url))
+    finally:
+        shutdown_parsing_pool()
+
+
+def wait_for_server(port: int, timeout: float = 10) -> None:
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Stand-in server did not start on port {port}")
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'service':<15}{'rows':>8}{'seconds':>10}{'rows/s':>10}{'peak MiB':>10}{'requests':>10}{'retries':>9}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['service']:<15} failed: {result['error']}")
+            continue
+        requests: int = sum(stage["requests"] for stage in result["requests"].values())
+        retries: int = sum(stage["retries"] for stage in result["requests"].values())
+        print(
+            f"{result['service']:<15}{result['exhibitors']:>8}{result['seconds']:>10}"
+            f"{result['exhibitors_per_second']:>10}{result['peak_rss_mib']:>10}{requests:>10}{retries:>9}"
+        )
+
+
+def main():
+    services: List[str] = sorted(create_services("", None, None))
+    parser = argparse.ArgumentParser(description="Run every parse service end to end against a local stand-in")
+    parser.add_argument("--service", action="append", choices=services, help="repeat to pick several, default all")
+    parser.add_argument("--exhibitors", type=int, default=1000, help="exhibitors served per fair")
+    # The default sits above INLINE_PARSE_LIMIT, so website pages are parsed in the pool as in production
+    parser.add_argument("--page-size", type=int, default=100 * 1024, help="approximate website size in bytes")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean injected latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of non-listing requests answered 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    server = context.Process(
+        target=serve,
+        args=(args.port, args.exhibitors, args.page_size, args.latency, args.error_rate, args.seed),
+        daemon=True,
+    )
+    server.start()
+    results: List[Dict[str, Any]] = []
+    try:
+        wait_for_server(args.port)
+        base_url: str = f"http://{HOST}:{args.port}"
+        for name in args.service or services:
+            # A fresh process per service keeps peak RSS and in-memory caches from leaking between runs
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    results.append(executor.submit(run_service_in_process, name, base_url).result())
+                except Exception as exc:
+                    results.append({"service": name, "error": repr(exc)})
+    finally:
+        server.terminate()
+        server.join()
+
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
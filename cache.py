@@ -0,0 +1,103 @@
+import json
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class WhatsappCache(object):
+    DEFAULT_PATH: str = "whatsapp_cache.sqlite3"
+    TTL: int = 90 * 24 * 60 * 60
+    NEGATIVE_TTL: int = 7 * 24 * 60 * 60
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: int = TTL, negative_ttl: int = NEGATIVE_TTL):
+        self.path: str = path
+        self.ttl: int = ttl
+        self.negative_ttl: int = negative_ttl
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS whatsapp ("
+            "phone_number TEXT PRIMARY KEY, exists_whatsapp INTEGER NOT NULL, checked_at REAL NOT NULL)"
+        )
+        self.__connection.commit()
+
+    def get(self, phone_number: str) -> Optional[bool]:
+        row = self.__connection.execute(
+            "SELECT exists_whatsapp, checked_at FROM whatsapp WHERE phone_number = ?", (phone_number,)
+        ).fetchone()
+        if row is None:
+            return None
+        exists_whatsapp, checked_at = bool(row[0]), row[1]
+        ttl: int = self.ttl if exists_whatsapp else self.negative_ttl
+        return exists_whatsapp if time.time() - checked_at < ttl else None
+
+    def set(self, phone_number: str, exists_whatsapp: bool) -> None:
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO whatsapp (phone_number, exists_whatsapp, checked_at) VALUES (?, ?, ?)",
+            (phone_number, int(exists_whatsapp), time.time())
+        )
+        self.__connection.commit()
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+class ExhibitorIndex(object):
+    DEFAULT_PATH: str = "exhibitor_index.sqlite3"
+    TTL: int = 90 * 24 * 60 * 60
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: int = TTL):
+        self.path: str = path
+        self.ttl: int = ttl
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS websites ("
+            "website TEXT PRIMARY KEY, contacts TEXT NOT NULL, enriched_at REAL NOT NULL, "
+            "crawled_fields TEXT NOT NULL DEFAULT '[]')"
+        )
+        # Indexes written before crawling existed only hold homepage lookups
+        columns: List[str] = [row[1] for row in self.__connection.execute("PRAGMA table_info(websites)")]
+        if "crawled_fields" not in columns:
+            self.__connection.execute("ALTER TABLE websites ADD COLUMN crawled_fields TEXT NOT NULL DEFAULT '[]'")
+        self.__connection.commit()
+
+    @staticmethod
+    def normalize_website(url: Optional[str]) -> Optional[str]:
+        if not isinstance(url, str) or not url.strip():
+            return None
+        url = url.strip()
+        parts = urlsplit(url if "//" in url else "//" + url)
+        host: str = (parts.hostname or "").removeprefix("www.")
+        if not host:
+            return None
+        # Most exhibitors link their home page, the path only matters for shared hosts such as social networks
+        return host + parts.path.rstrip("/")
+
+    def get_entry(self, url: Optional[str]) -> Optional[Tuple[Dict[str, List], List[str]]]:
+        # The crawled fields are those a contact-page crawl looked for, empty after a homepage-only lookup
+        website: Optional[str] = self.normalize_website(url)
+        if website is None:
+            return None
+        row = self.__connection.execute(
+            "SELECT contacts, enriched_at, crawled_fields FROM websites WHERE website = ?", (website,)
+        ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(row[0]), json.loads(row[2])
+
+    def set_contacts(self, url: Optional[str], contacts: Dict[str, List], crawled_fields: Iterable[str] = ()) -> None:
+        website: Optional[str] = self.normalize_website(url)
+        if website is None:
+            return
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO websites (website, contacts, enriched_at, crawled_fields) VALUES (?, ?, ?, ?)",
+            (website, json.dumps(contacts, ensure_ascii=False), time.time(), json.dumps(sorted(crawled_fields)))
+        )
+        self.__connection.commit()
+
+    def close(self) -> None:
+        self.__connection.close()
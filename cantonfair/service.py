@@ -1,23 +1,37 @@
-import asyncio
-from typing import Tuple, List, Dict
+from typing import AsyncIterator, Tuple, List, Dict, Optional
 
-import requests
 from bs4 import BeautifulSoup
-from requests import Response
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
+from phone_numbers import normalize_phone_numbers, recreate_phone_number
 from services import WhatsappService
-from tools import parsing_emails_from_website, parsing_phone_numbers_from_website, recreate_phone_number
+from tools import ContactCrawler, parsing_emails_from_website, parsing_phone_numbers_from_website
 
 
 class CantonfairParseService(AbstractParseService):
     Cantonfair_API_URL: str = "https://www.cantonfair.org.cn"
     DEFAULT_COUNTRY_PHONE_CODE: str = "86"
     SIZE_PER_REQUEST: int = 200
-
-    def __init__(self, auth: str, whatsapp: WhatsappService):
+    MAX_RETRIES: int = 3
+
+    def __init__(
+            self,
+            auth: str,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+    ):
         self.auth = auth
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
@@ -25,31 +39,27 @@ class CantonfairParseService(AbstractParseService):
             "Whatsapp Links", "Fax", "Zip Code", "Website", "Detail Link", "Company Type", "Business Type", \
             "Product Type", "Address"
 
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
+        phones: List = [phone for phone in {exhibitor["phoneNumber"], exhibitor["telephone"]} if phone]
         return [
-            [
-                exhibitor["name"],
-                exhibitor["status"],
-                exhibitor["country"],
-                exhibitor["countryCode"],
-                exhibitor["companyPerson"],
-                exhibitor["email"],
-                [phone for phone in {exhibitor["phoneNumber"], exhibitor["telephone"]} if phone],
-                [
-                    await self.whatsapp.format_to_whatsapp_link(
-                        self.DEFAULT_COUNTRY_PHONE_CODE + phone if phone and len(phone) == 11 else phone
-                    )
-                    for phone in {exhibitor["phoneNumber"], exhibitor["telephone"]} if phone
-                ],
-                exhibitor["fax"],
-                exhibitor["zipCode"],
-                exhibitor["website"],
-                exhibitor["detailLink"],
-                exhibitor["companyType"],
-                exhibitor["businessType"],
-                exhibitor["productType"],
-                exhibitor["address"],
-            ] for exhibitor in exhibitors
+            exhibitor["name"],
+            exhibitor["status"],
+            exhibitor["country"],
+            exhibitor["countryCode"],
+            exhibitor["companyPerson"],
+            exhibitor["email"],
+            phones,
+            await self.whatsapp.format_to_whatsapp_links(
+                normalize_phone_numbers(phones, exhibitor["countryCode"], self.DEFAULT_COUNTRY_PHONE_CODE)
+            ),
+            exhibitor["fax"],
+            exhibitor["zipCode"],
+            exhibitor["website"],
+            exhibitor["detailLink"],
+            exhibitor["companyType"],
+            exhibitor["businessType"],
+            exhibitor["productType"],
+            exhibitor["address"],
         ]
 
     async def __parse_detail_exhibitor(self, code: str) -> Dict:
@@ -58,15 +68,14 @@ class CantonfairParseService(AbstractParseService):
         params = {"shopCode": code, "lang": "en-US"}
         cookies = {"_authI": self.auth}
 
-        print(f"Start to parse {code}")
-
-        request: Response = await asyncio.to_thread(
-            requests.get, url=url, params=params, cookies=cookies, headers=headers
+        request: HttpResponse = await self.client.get(
+            url, params=params, cookies=cookies, headers=headers, cached=True, stage="detail", retries=self.MAX_RETRIES
         )
+        # An error page is not JSON, the failure has to name the shop rather than the decoder
+        if request.status_code != 200:
+            raise RuntimeError(f"Cantonfair shop {code} detail failed with status {request.status_code}")
 
         exhibitor: Dict = request.json()["arrayData"]["0"]
-        print(exhibitor["udfs"]["email"], exhibitor["udfs"]["mobilePhone"], exhibitor["udfs"]["telephone"])
-        print(f"https://www.cantonfair.org.cn/en-US/shops/{code}")
         return {
             "name": exhibitor["name"],
             "country": exhibitor["address"]["country"]["name"] if exhibitor["address"]["country"] else None,
@@ -87,34 +96,46 @@ class CantonfairParseService(AbstractParseService):
             "zipCode": exhibitor["udfs"]["zipCode"],
         }
 
-    async def __parse_exhibitors(self) -> List:
-        exhibitors: list = []
+    async def __parse_exhibitor(self, code: str) -> List:
+        exhibitor: Dict = await self._checkpoint("detail", code, lambda: self.__parse_detail_exhibitor(code))
+        return await self.__format_exhibitor_data(exhibitor)
+
+    async def __parse_page(self, page: int) -> Dict:
         url: str = self.Cantonfair_API_URL + "/b2bshop/api/themeRos/public/productShops/searchByVariables"
         params = {
-            "productSearchable": False, "size": self.SIZE_PER_REQUEST, "scoreStrategy": "shop"
+            "productSearchable": False, "size": self.SIZE_PER_REQUEST, "scoreStrategy": "shop", "page": page
+        }
+
+        request: HttpResponse = await self.client.get(url, params=params, stage="listing", retries=self.MAX_RETRIES)
+        if request.status_code != 200:
+            raise RuntimeError(f"Cantonfair search page {page} failed with status {request.status_code}")
+        data: Dict = request.json()["arrayData"]["0"]
+        return {
+            "codes": [company["code"] for company in data["_embedded"]["b2b:shops"]],
+            "totalPages": data["page"]["totalPages"],
+            "totalElements": data["page"]["totalElements"],
         }
 
-        request: Response = await asyncio.to_thread(requests.get, url=url, params=params)
-        codes: List = [company["code"] for company in request.json()["arrayData"]["0"]["_embedded"]["b2b:shops"]]
-        count = request.json()["arrayData"]["0"]["page"]["totalPages"]
-        elements = request.json()["arrayData"]["0"]["page"]["totalElements"]
+    async def __parse_page_codes(self, page: int) -> List:
+        return (await self._checkpoint("page", page, lambda: self.__parse_page(page)))["codes"]
 
-        print(f"Pages: {count} Elements: {elements}")
+    async def __parse_row(self, code: str) -> List:
+        return await self._checkpoint("row", code, lambda: self.__parse_exhibitor(code))
 
-        for _ in range(1, count):
-            print(f"Parse {_} page in {count}")
-            request: Response = await asyncio.to_thread(requests.get, url=url, params=params | {"page": _})
-            codes.extend([company["code"] for company in request.json()["arrayData"]["0"]["_embedded"]["b2b:shops"]])
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        page: Dict = await self._checkpoint("page", 0, lambda: self.__parse_page(0))
+        count = page["totalPages"]
+        elements = page["totalElements"]
 
-        background_tasks: list = [asyncio.create_task(self.__parse_detail_exhibitor(code)) for code in codes]
-        for background_task in background_tasks:
-            data: list = await background_task
-            exhibitors.append(data),
+        print(f"Pages: {count} Elements: {elements}")
 
-        return await self.__format_exhibitors_data(exhibitors)
+        async for exhibitor in self._yield_pipelined(
+                self.__parse_row, pages=map(self.__parse_page_codes, range(1, count)), items=page["codes"]
+        ):
+            yield exhibitor
 
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
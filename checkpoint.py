@@ -0,0 +1,51 @@
+import json
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Tuple
+
+
+class CheckpointStore(object):
+    DEFAULT_PATH: str = "checkpoints.sqlite3"
+
+    def __init__(self, run_id: str, path: str = DEFAULT_PATH):
+        self.run_id: str = run_id
+        self.path: str = path
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT NOT NULL, stage TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (run_id, stage, key))"
+        )
+        self.__connection.commit()
+
+    def get(self, stage: str, key: Any) -> Tuple[bool, Any]:
+        row = self.__connection.execute(
+            "SELECT value FROM checkpoints WHERE run_id = ? AND stage = ? AND key = ?", (self.run_id, stage, str(key))
+        ).fetchone()
+        return (True, json.loads(row[0])) if row is not None else (False, None)
+
+    def set(self, stage: str, key: Any, value: Any) -> None:
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO checkpoints (run_id, stage, key, value, created_at) VALUES (?, ?, ?, ?, ?)",
+            (self.run_id, stage, str(key), json.dumps(value, ensure_ascii=False), time.time())
+        )
+        self.__connection.commit()
+
+    async def load(self, stage: str, key: Any, factory: Callable[[], Awaitable]) -> Any:
+        found, value = self.get(stage, key)
+        if found:
+            return value
+        value = await factory()
+        # Services answer failed requests with empty results, those have to be retried on resume
+        if value:
+            self.set(stage, key, value)
+        return value
+
+    def clear(self) -> None:
+        self.__connection.execute("DELETE FROM checkpoints WHERE run_id = ?", (self.run_id,))
+        self.__connection.commit()
+
+    def close(self) -> None:
+        self.__connection.close()
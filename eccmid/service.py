@@ -1,58 +1,75 @@
-import asyncio
-from typing import Tuple, List
+from functools import partial
+from typing import AsyncIterator, Dict, Tuple, List, Optional
 
-import requests
 from bs4 import BeautifulSoup
-from requests import Response
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
+from parsing_pool import parse_in_pool
+from phone_numbers import recreate_phone_number
 from services import WhatsappService
-from tools import parsing_emails_from_website, parsing_phone_numbers_from_website, validate_phone_number, \
-    recreate_phone_number
+from tools import ContactCrawler, parsing_contacts_from_website
+
+
+def _parse_sponsor_list(content: bytes) -> List[Dict]:
+    soup = BeautifulSoup(content, "lxml")
+    expositor_websites = soup.find_all("a", class_="linksside")
+    return [{"title": data.text, "website": data["href"]} for data in expositor_websites]
 
 
 class EccmidParseService(AbstractParseService):
     Eccmid_URL: str = "https://www.eccmid.org/sponsorship-and-exhibition/sponsor-list"
     DEFAULT_COUNTRY_PHONE_CODE: str = "34"
 
-    def __init__(self, whatsapp: WhatsappService):
+    def __init__(
+            self,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+    ):
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
         return "Title", "Website", "Emails", "Phones"
 
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
-        exhibitors = [
-            exhibitor | {
-                "emails": asyncio.create_task(parsing_emails_from_website(exhibitor["website"]))
-            } for exhibitor in exhibitors
-        ]
-        exhibitors = [
-            exhibitor | {
-                "phone_numbers": asyncio.create_task(
-                    parsing_phone_numbers_from_website(exhibitor["website"])
-                )
-            } for exhibitor in exhibitors
-        ]
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
+        contacts: Dict = await parsing_contacts_from_website(
+            self.client, exhibitor["website"], self.index, self.crawler
+        )
         return [
-            [
-                exhibitor["title"],
-                exhibitor["website"],
-                await exhibitor["emails"],
-                [recreate_phone_number(phone_number) for phone_number in await exhibitor["phone_numbers"]],
-            ] for exhibitor in exhibitors
+            exhibitor["title"],
+            exhibitor["website"],
+            contacts["emails"],
+            [recreate_phone_number(phone_number) for phone_number in contacts["phones"]],
         ]
 
-    async def __parse_exhibitors(self) -> List:
-        request: Response = await asyncio.to_thread(requests.get, url=self.Eccmid_URL)
-        soup = BeautifulSoup(request.content, "lxml")
-        expositor_websites = soup.find_all("a", class_="linksside")
-        exhibitors: list = [{"title": data.text, "website": data["href"]} for data in expositor_websites]
-        return await self.__format_exhibitors_data(exhibitors) if request.status_code == 200 else []
+    async def __parse_page(self) -> List:
+        request: HttpResponse = await self.client.get(self.Eccmid_URL, stage="listing")
+        if request.status_code != 200:
+            return []
+        return await parse_in_pool(_parse_sponsor_list, request.content)
+
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        exhibitors: List = await self._checkpoint("page", 0, self.__parse_page)
+        self.client.warm_up(exhibitor["website"] for exhibitor in exhibitors)
+        # Sponsors of one group share a website, the position in the checkpointed listing is the unique key
+        async for exhibitor in self._yield_as_completed(
+                self._checkpoint("row", position, partial(self.__format_exhibitor_data, exhibitor))
+                for position, exhibitor in enumerate(exhibitors)
+        ):
+            yield exhibitor
 
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
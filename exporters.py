@@ -0,0 +1,153 @@
+import csv
+import gzip
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, IO, List, Optional, Tuple, Type
+
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from openpyxl.workbook import Workbook
+
+from abstract import AbstractParseService
+
+
+class AbstractExporter(ABC):
+    def __init__(self, filename: str, parsed_data_names: Tuple):
+        self.filename: str = filename
+        self.parsed_data_names: Tuple = parsed_data_names
+
+    @abstractmethod
+    def append(self, row: List) -> None:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+    async def export(self, service: AbstractParseService) -> None:
+        async for row in service.stream():
+            self.append(row)
+
+    def __enter__(self) -> "AbstractExporter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ExcelExporter(AbstractExporter):
+    EXTENSION: str = "xlsx"
+    COLUMN_WIDTH: int = 50
+    HREF_PREFIXES: Tuple = ("http://", "https://")
+
+    def __init__(self, filename: str, parsed_data_names: Tuple, sheet_name: str):
+        super().__init__(filename, parsed_data_names)
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(sheet_name)
+
+        for i in range(len(parsed_data_names)):
+            self.sheet.column_dimensions[get_column_letter(i + 1)].width = self.COLUMN_WIDTH
+        header: list = []
+        for name in parsed_data_names:
+            cell = WriteOnlyCell(self.sheet, value=str(name))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        self.sheet.append(header)
+
+    def __is_href(self, text: str) -> bool:
+        return text.startswith(self.HREF_PREFIXES) and not any(ch.isspace() for ch in text)
+
+    def __format_cell(self, value: Any) -> Optional[WriteOnlyCell]:
+        if not value:
+            return None
+        data: str = ILLEGAL_CHARACTERS_RE.sub(r'', str(value))
+        cell = WriteOnlyCell(self.sheet, value=data)
+        if self.__is_href(data):
+            cell.style = "Hyperlink"
+            cell.hyperlink = data
+        return cell
+
+    def append(self, row: List) -> None:
+        # List values spill onto the following rows, one item per row
+        height: int = max([len(value) for value in row if isinstance(value, list)] + [1])
+        for k in range(height):
+            self.sheet.append([
+                self.__format_cell(value[k] if k < len(value) else None) if isinstance(value, list)
+                else self.__format_cell(value) if k == 0 else None
+                for value in row
+            ])
+
+    def close(self) -> None:
+        self.workbook.save(self.filename)
+
+
+class _TextFileExporter(AbstractExporter, ABC):
+    BUFFER_SIZE: int = 1024 * 1024
+
+    def __init__(self, filename: str, parsed_data_names: Tuple, compress: bool = False):
+        super().__init__(filename + ".gz" if compress and not filename.endswith(".gz") else filename, parsed_data_names)
+        self.file: IO = (
+            gzip.open(self.filename, "wt", encoding="utf-8", newline="") if compress
+            else open(self.filename, "w", encoding="utf-8", newline="", buffering=self.BUFFER_SIZE)
+        )
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class CsvExporter(_TextFileExporter):
+    EXTENSION: str = "csv"
+    LIST_DELIMITER: str = "; "
+
+    def __init__(
+            self,
+            filename: str,
+            parsed_data_names: Tuple,
+            compress: bool = False,
+            list_delimiter: str = LIST_DELIMITER,
+            explode_lists: bool = False,
+    ):
+        super().__init__(filename, parsed_data_names, compress)
+        self.list_delimiter: str = list_delimiter
+        self.explode_lists: bool = explode_lists
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(parsed_data_names)
+
+    @staticmethod
+    def __format_cell(value: Any) -> str:
+        return "" if value is None else str(value)
+
+    def append(self, row: List) -> None:
+        if not self.explode_lists:
+            self.writer.writerow([
+                self.list_delimiter.join(self.__format_cell(item) for item in value) if isinstance(value, list)
+                else self.__format_cell(value)
+                for value in row
+            ])
+            return
+
+        # One line per list item, scalar values are repeated so every line stands on its own
+        height: int = max([len(value) for value in row if isinstance(value, list)] + [1])
+        self.writer.writerows([
+            [
+                self.__format_cell(value[k] if k < len(value) else None) if isinstance(value, list)
+                else self.__format_cell(value)
+                for value in row
+            ] for k in range(height)
+        ])
+
+
+class JsonLinesExporter(_TextFileExporter):
+    EXTENSION: str = "jsonl"
+
+    def append(self, row: List) -> None:
+        self.file.write(json.dumps(dict(zip(self.parsed_data_names, row)), ensure_ascii=False, default=str) + "\n")
+
+
+EXPORTERS: Dict[str, Type[AbstractExporter]] = {
+    ExcelExporter.EXTENSION: ExcelExporter,
+    CsvExporter.EXTENSION: CsvExporter,
+    JsonLinesExporter.EXTENSION: JsonLinesExporter,
+}
@@ -0,0 +1,106 @@
+import html
+import re
+from typing import Callable, Dict, List, Tuple
+
+
+# Emails are found from their "@", prose with no email then costs one find instead of a regex try at every word
+EMAIL_USER_PATTERN = re.compile(rb"[a-zA-Z0-9._%+-]+$")
+EMAIL_DOMAIN_PATTERN = re.compile(rb"[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4}")
+EMAIL_USER_MAX_LENGTH: int = 64
+# Obfuscated emails are found from their rare "[at]" token, the user and domain are then read around it
+OBFUSCATED_AT_PATTERN = re.compile(rb"[\[({]\s*(?:at|@)\s*[\])}]", re.IGNORECASE)
+OBFUSCATED_USER_PATTERN = re.compile(rb"([a-zA-Z0-9._%+-]+)\s*$")
+OBFUSCATED_DOMAIN_PATTERN = re.compile(
+    rb"\s*([a-zA-Z0-9-]+(?:\s*(?:[\[({]\s*(?:dot|\.)\s*[\])}]|\.)\s*[a-zA-Z0-9-]+)+)", re.IGNORECASE
+)
+OBFUSCATED_DOT_PATTERN = re.compile(rb"\s*(?:[\[({]\s*(?:dot|\.)\s*[\])}]|\.)\s*", re.IGNORECASE)
+# "\+\d|\d" is "\+?\d" with a first character the regex engine can skip to
+PHONE_PATTERN = re.compile(rb"(?:\+\d|\d)\d{0,2}\s?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{2}[-.\s]?\d{2}")
+# Only real links count, "Hotel: Grand Hyatt" in the page text is not a phone number
+MAILTO_PATTERN = re.compile(rb"href\s*=\s*[\"']\s*mailto:([^\"'?\s<>]+)", re.IGNORECASE)
+TEL_PATTERN = re.compile(rb"href\s*=\s*[\"']\s*tel:([^\"'<>]+)", re.IGNORECASE)
+SOCIAL_PATTERN = re.compile(
+    rb"https?://(?:[a-z]{2,3}\.)?(?:facebook|instagram|linkedin|twitter|x|youtube|tiktok)\.com/[^\"'\s<>]*",
+    re.IGNORECASE
+)
+INVISIBLE_BLOCK_PATTERN = re.compile(rb"<(script|style|noscript)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(rb"<[^>]*>")
+ENTITY_PATTERN = re.compile(rb"&#?[a-zA-Z0-9]+;")
+# Anchor text is bounded, an unclosed <a> must not make every later link scan to the end of the page
+LINK_PATTERN = re.compile(
+    rb"<a\b[^>]*?\bhref\s*=\s*[\"']([^\"'#]+)[^\"']*[\"'][^>]*>(?:(.{0,512}?)</a\s*>)?", re.IGNORECASE | re.DOTALL
+)
+
+# Retina assets such as logo@2x.png look exactly like emails
+NOT_EMAIL_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".css", ".js")
+
+
+def get_page_text(content: bytes) -> bytes:
+    text: bytes = TAG_PATTERN.sub(b" ", INVISIBLE_BLOCK_PATTERN.sub(b" ", content))
+    if b"&" not in text:
+        return text
+    return ENTITY_PATTERN.sub(lambda m: html.unescape(m.group().decode("ascii")).encode("utf-8"), text)
+
+
+def _decode(values) -> List:
+    return list({value.decode("utf-8", errors="ignore").strip() for value in values} - {""})
+
+
+def extract_plain_emails(text: bytes) -> List[bytes]:
+    emails: List[bytes] = []
+    at: int = text.find(b"@")
+    while at != -1:
+        user = EMAIL_USER_PATTERN.search(text, max(at - EMAIL_USER_MAX_LENGTH, 0), at)
+        domain = EMAIL_DOMAIN_PATTERN.match(text, at + 1)
+        if user and domain:
+            emails.append(user.group() + b"@" + domain.group())
+        at = text.find(b"@", at + 1)
+    return emails
+
+
+def extract_obfuscated_emails(text: bytes) -> List[bytes]:
+    emails: List[bytes] = []
+    for at in OBFUSCATED_AT_PATTERN.finditer(text):
+        # Spaces may sit between the user and the token, leave room for them
+        user = OBFUSCATED_USER_PATTERN.search(text, max(at.start() - EMAIL_USER_MAX_LENGTH - 16, 0), at.start())
+        domain = OBFUSCATED_DOMAIN_PATTERN.match(text, at.end())
+        if user and domain:
+            emails.append(user.group(1) + b"@" + OBFUSCATED_DOT_PATTERN.sub(b".", domain.group(1)))
+    return emails
+
+
+def extract_emails(content: bytes, text: bytes) -> List:
+    emails: list = MAILTO_PATTERN.findall(content) + extract_plain_emails(text) + extract_obfuscated_emails(text)
+    return [email for email in _decode(emails) if not email.lower().endswith(NOT_EMAIL_SUFFIXES)]
+
+
+def extract_phones(content: bytes, text: bytes) -> List:
+    return _decode(TEL_PATTERN.findall(content) + PHONE_PATTERN.findall(text))
+
+
+def extract_socials(content: bytes, text: bytes) -> List:
+    return _decode(SOCIAL_PATTERN.findall(content))
+
+
+CONTACT_EXTRACTORS: Dict[str, Callable[[bytes, bytes], List]] = {
+    "emails": extract_emails,
+    "phones": extract_phones,
+    "socials": extract_socials,
+}
+
+
+def extract_contacts(content: bytes) -> Dict[str, List]:
+    text: bytes = get_page_text(content)
+    return {name: extractor(content, text) for name, extractor in CONTACT_EXTRACTORS.items()}
+
+
+def extract_links(content: bytes) -> List[Tuple[str, str]]:
+    # The anchor text is kept next to the href, "Kontakt" or "Aviso legal" often point to opaque urls
+    return [
+        (href.decode("utf-8", errors="ignore").strip(), get_page_text(text).decode("utf-8", errors="ignore").strip())
+        for href, text in LINK_PATTERN.findall(content)
+    ]
+
+
+def extract_contacts_and_links(content: bytes) -> Tuple[Dict[str, List], List[Tuple[str, str]]]:
+    return extract_contacts(content), extract_links(content)
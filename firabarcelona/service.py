@@ -1,12 +1,15 @@
 import asyncio
-from typing import List, Tuple, Dict
+from functools import partial
+from typing import AsyncIterator, List, Tuple, Dict, Optional
 
-import requests
-from requests import Response
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
+from phone_numbers import normalize_phone_numbers
 from services import WhatsappService
-from tools import parsing_emails_from_website
+from tools import ContactCrawler, parsing_emails_from_website
 
 
 class FiraBarcelonaParseService(AbstractParseService):
@@ -17,12 +20,32 @@ class FiraBarcelonaParseService(AbstractParseService):
     LANGUAGE_DEFAULT_CODE: str = "en_EN"
     DEFAULT_COUNTRY_PHONE_CODE: str = "34"
     MAX_EXHIBITORS_PER_REQUEST: int = 1000
-
-    def __init__(self, sap_code: str, catalog_id: int, catalog_name: str, whatsapp: WhatsappService):
+    UNDEFINED_COUNTRY_NAME: str = "Undefined"
+
+    # Country names only depend on the language, so every catalog of the run shares one index per language
+    __countries: Dict[str, Dict[int, str]] = {}
+
+    def __init__(
+            self,
+            sap_code: str,
+            catalog_id: int,
+            catalog_name: str,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+    ):
         self.sap_code: str = sap_code
         self.catalog_id: int = catalog_id
         self.catalog_name: str = catalog_name
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
+        self.__countries_loaded: bool = False
+        self.__countries_lock = asyncio.Lock()
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
@@ -40,59 +63,56 @@ class FiraBarcelonaParseService(AbstractParseService):
             "Detail link",
         )
 
-    async def __get_country_name_by_id(self, country_id: int) -> str:
-        country_name: str = "Undefined"
+    async def __load_countries(self) -> None:
         url: str = self.ECatalogue_DETAIL_API_URL + f"/catalogues/{self.catalog_id}/countriesInUse"
         params: dict = {"language": self.LANGUAGE_DEFAULT_CODE}
 
-        request: Response = await asyncio.to_thread(requests.get, url=url, params=params)
+        request: HttpResponse = await self.client.get(url, params=params, stage="listing")
         countries: list = request.json()["_embedded"]["countries"] if request.status_code == 200 else []
 
-        for country in countries:
-            if country["id"] == country_id:
-                country_name = country["name"]
-                break
-
-        return country_name
-
-    def __format_phone_number(self, phone_number: str) -> str:
-        if not phone_number:
-            return phone_number
-
-        # +(xxx or xx) xx xxx-xx-xx !!! min 11 chars
-        phone_number: str = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-
-        return self.DEFAULT_COUNTRY_PHONE_CODE + phone_number if not 11 <= len(phone_number) else phone_number
+        self.__countries.setdefault(self.LANGUAGE_DEFAULT_CODE, {}).update(
+            {country["id"]: country["name"] for country in countries}
+        )
 
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
+    async def __get_country_name_by_id(self, country_id: int) -> str:
+        countries: Dict[int, str] = self.__countries.get(self.LANGUAGE_DEFAULT_CODE, {})
+        if country_id in countries:
+            return countries[country_id]
+
+        # An unknown id means the index was built from another catalog, refresh it once from this one
+        async with self.__countries_lock:
+            if not self.__countries_loaded:
+                await self.__load_countries()
+                self.__countries_loaded = True
+
+        return self.__countries[self.LANGUAGE_DEFAULT_CODE].get(country_id, self.UNDEFINED_COUNTRY_NAME)
+
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
+        # The website only comes with the detail, it still resolves while the country and WhatsApp lookups run
+        self.client.warm_up([exhibitor["webSite"]])
+        country: str = await self.__get_country_name_by_id(exhibitor["countryId"])
+        phone_numbers: List[str] = normalize_phone_numbers(
+            [exhibitor["contactTelephone"], exhibitor["telephone"]], country, self.DEFAULT_COUNTRY_PHONE_CODE
+        )
         return [
-            [
-                exhibitor["name"],
-                await self.__get_country_name_by_id(exhibitor["countryId"]),
-                [i for i in list(
-                    {
-                        await self.whatsapp.format_to_whatsapp_link(
-                            self.__format_phone_number(exhibitor["contactTelephone"])
-                        ),
-                        await self.whatsapp.format_to_whatsapp_link(self.__format_phone_number(exhibitor["telephone"])),
-                    }
-                )if i],
-                [i for i in list({exhibitor["contactTelephone"], exhibitor["telephone"]}) if i],
-                [i for i in list({exhibitor["contactEmail"], exhibitor["email"]}) if i],
-                exhibitor["contactName"],
-                exhibitor["contactPost"],
-                await parsing_emails_from_website(exhibitor["webSite"]),
-                exhibitor["facebookUrl"],
-                exhibitor["webSite"],
-                self.ECatalogue_WEB_URL + f'/{self.catalog_name}/exhibitor/{exhibitor["id"]}/detail'
-            ] for exhibitor in exhibitors
+            exhibitor["name"],
+            country,
+            [i for i in await self.whatsapp.format_to_whatsapp_links(phone_numbers) if i],
+            [i for i in list({exhibitor["contactTelephone"], exhibitor["telephone"]}) if i],
+            [i for i in list({exhibitor["contactEmail"], exhibitor["email"]}) if i],
+            exhibitor["contactName"],
+            exhibitor["contactPost"],
+            await parsing_emails_from_website(self.client, exhibitor["webSite"], self.index, self.crawler),
+            exhibitor["facebookUrl"],
+            exhibitor["webSite"],
+            self.ECatalogue_WEB_URL + f'/{self.catalog_name}/exhibitor/{exhibitor["id"]}/detail'
         ]
 
     async def __get_number_of_required_requests(self) -> int:
         url: str = self.ECatalogue_DETAIL_API_URL + f"/catalogues/{self.catalog_id}/countItems"
         params: dict = {"language": self.LANGUAGE_DEFAULT_CODE}
 
-        request: Response = await asyncio.to_thread(requests.get, url=url, params=params)
+        request: HttpResponse = await self.client.get(url, params=params, stage="listing")
         quantity: int = request.json()["EXHIBITORS"] if request.status_code == 200 else 0
 
         return quantity // self.MAX_EXHIBITORS_PER_REQUEST + (1 if quantity % self.MAX_EXHIBITORS_PER_REQUEST else 0)
@@ -101,47 +121,41 @@ class FiraBarcelonaParseService(AbstractParseService):
         url: str = self.ECatalogue_DETAIL_API_URL + f"/exhibitors/{exhibitor_id}"
         params: dict = {"projection": "detail", "language": self.LANGUAGE_DEFAULT_CODE}
 
-        request: Response = await asyncio.to_thread(requests.get, url=url, params=params)
+        request: HttpResponse = await self.client.get(url, params=params, cached=True, stage="detail")
         return request.json() if request.status_code == 200 else []
 
-    async def __parse_exhibitors_per_page(self, page: int) -> List:
-        exhibitors: list = []
+    async def __parse_exhibitor(self, exhibitor_id: int) -> List:
+        return await self.__format_exhibitor_data(
+            await self._checkpoint(
+                "detail", exhibitor_id, lambda: self.__parse_detail_exhibitor_information(exhibitor_id=exhibitor_id)
+            )
+        )
+
+    async def __parse_exhibitor_ids_per_page(self, page: int) -> List:
         url: str = self.ECatalogue_SEARCH_API_URL + "/us/unifiedSearch"
         js = {"sapCode": self.sap_code, "filter": "ONLY_EXHIBITORS"}
         params = {"page": page, "size": self.MAX_EXHIBITORS_PER_REQUEST, "language": self.LANGUAGE_DEFAULT_CODE}
         headers = {"Accept": "application/json, text/plain, */*"}
 
-        request: Response = await asyncio.to_thread(requests.post, url=url, json=js, params=params, headers=headers)
-
-        background_tasks: list = []
-        for exhibitor_id in [_["entityId"] for _ in request.json()["list"]] if request.status_code == 200 else []:
-            background_tasks.append(
-                asyncio.create_task(self.__parse_detail_exhibitor_information(exhibitor_id=exhibitor_id))
-            )
-
-        for background_task in background_tasks:
-            data: list = await background_task
-            exhibitors.append(data),
-
-        return exhibitors
-
-    async def __parse_exhibitors(self) -> List:
-        exhibitors: list = []
-        background_tasks: list = []
-
-        for _ in range(await self.__get_number_of_required_requests()):
-            background_tasks.append(
-                asyncio.create_task(self.__parse_exhibitors_per_page(page=_))
-            )
-
-        for background_task in background_tasks:
-            data: list = await background_task
-            exhibitors += *data,
-
-        return await self.__format_exhibitors_data(exhibitors)
-
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+        request: HttpResponse = await self.client.post(url, json=js, params=params, headers=headers, stage="listing")
+        return [_["entityId"] for _ in request.json()["list"]] if request.status_code == 200 else []
+
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        number_of_pages: int = await self.__get_number_of_required_requests()
+        pages: List = await asyncio.gather(*[
+            self._checkpoint("page", _, partial(self.__parse_exhibitor_ids_per_page, page=_))
+            for _ in range(number_of_pages)
+        ])
+        exhibitor_ids: list = [exhibitor_id for page in pages for exhibitor_id in page]
+
+        async for exhibitor in self._yield_as_completed(
+                self._checkpoint("row", exhibitor_id, partial(self.__parse_exhibitor, exhibitor_id))
+                for exhibitor_id in exhibitor_ids
+        ):
+            yield exhibitor
+
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
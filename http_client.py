@@ -0,0 +1,437 @@
+import asyncio
+import base64
+import gzip
+import json
+import os
+import sqlite3
+import time
+from typing import IO, Any, Dict, Iterable, Mapping, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from metrics import DEFAULT_STAGE, RequestMetrics
+from resolver import CachingResolver
+from scheduler import RequestScheduler
+
+
+Timeout = Union[None, float, Tuple[float, float], aiohttp.ClientTimeout]
+
+
+class HttpResponse(object):
+    def __init__(
+            self, url: str, status_code: int, headers: Mapping[str, str], content: bytes, encoding: Optional[str]
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class CachedResponse(object):
+    def __init__(self, response: HttpResponse, stored_at: float):
+        self.response = response
+        self.stored_at: float = stored_at
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.response.headers.get("ETag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.response.headers.get("Last-Modified")
+
+
+class HttpCache(object):
+    DEFAULT_PATH: str = "http_cache.sqlite3"
+    MAX_SIZE: int = 1024 * 1024 * 1024
+    FRESHNESS: float = 0
+    EVICTION_BATCH: int = 100
+
+    def __init__(
+            self,
+            path: str = DEFAULT_PATH,
+            max_size: int = MAX_SIZE,
+            default_freshness: float = FRESHNESS,
+            freshness: Optional[Dict[str, float]] = None,
+    ):
+        self.path: str = path
+        self.max_size: int = max_size
+        self.default_freshness: float = default_freshness
+        self.freshness: Dict[str, float] = freshness or {}
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status_code INTEGER NOT NULL, headers TEXT NOT NULL, "
+            "content BLOB NOT NULL, encoding TEXT, size INTEGER NOT NULL, stored_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.__connection.commit()
+        self.__size: int = self.__connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict]) -> str:
+        return url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+
+    def is_fresh(self, url: str, cached_response: CachedResponse) -> bool:
+        freshness: float = self.freshness.get(urlsplit(url).hostname or "", self.default_freshness)
+        return time.time() - cached_response.stored_at < freshness
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self.__connection.execute(
+            "SELECT url, status_code, headers, content, encoding, stored_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.__connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self.__connection.commit()
+        url, status_code, headers, content, encoding, stored_at = row
+        response = HttpResponse(
+            url=url,
+            status_code=status_code,
+            headers=CIMultiDictProxy(CIMultiDict(json.loads(headers))),
+            content=content,
+            encoding=encoding,
+        )
+        return CachedResponse(response, stored_at)
+
+    def set(self, key: str, response: HttpResponse) -> None:
+        size: int = len(response.content)
+        previous = self.__connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        now: float = time.time()
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(key, url, status_code, headers, content, encoding, size, stored_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, response.url, response.status_code, json.dumps(list(response.headers.items())),
+                response.content, response.encoding, size, now, now
+            )
+        )
+        self.__size += size - (previous[0] if previous else 0)
+        self.__evict()
+        self.__connection.commit()
+
+    def revalidate(self, key: str) -> None:
+        now: float = time.time()
+        self.__connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+        self.__connection.commit()
+
+    def __evict(self) -> None:
+        while self.__size > self.max_size:
+            rows = self.__connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT ?", (self.EVICTION_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.__size <= self.max_size:
+                    break
+                self.__connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.__size -= size
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+class CaptureStore(object):
+    DEFAULT_DIRECTORY: str = "captures"
+    EXTENSION: str = "jsonl.gz"
+    FLUSH_EVERY: int = 100
+
+    def __init__(self, run_id: str, directory: str = DEFAULT_DIRECTORY):
+        self.run_id: str = run_id
+        self.path: str = os.path.join(directory, f"{run_id}.{self.EXTENSION}")
+        self.__file: Optional[IO] = None
+        self.__pending: int = 0
+        self.__responses: Optional[Dict[str, HttpResponse]] = None
+
+    @staticmethod
+    def make_key(method: str, url: str, params: Optional[Dict], data: Any, json_data: Any) -> str:
+        body: str = json.dumps({"data": data, "json": json_data}, sort_keys=True, default=str)
+        return f"{method} {url}?{json.dumps(params or {}, sort_keys=True, default=str)} {body}"
+
+    def append(self, key: str, stage: str, response: HttpResponse) -> None:
+        if self.__file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Every run appends a new gzip member, concatenated members still read as one stream
+            self.__file = gzip.open(self.path, "at", encoding="utf-8")
+        record: dict = {
+            "key": key,
+            "stage": stage,
+            "url": response.url,
+            "status_code": response.status_code,
+            "headers": list(response.headers.items()),
+            "encoding": response.encoding,
+        }
+        try:
+            record["content"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            record["content_base64"] = base64.b64encode(response.content).decode("ascii")
+        self.__file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.__pending += 1
+        if self.__pending >= self.FLUSH_EVERY:
+            self.__file.flush()
+            self.__pending = 0
+
+    def load(self) -> Dict[str, HttpResponse]:
+        responses: Dict[str, HttpResponse] = {}
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            try:
+                for line in file:
+                    record: dict = json.loads(line)
+                    responses[record["key"]] = HttpResponse(
+                        url=record["url"],
+                        status_code=record["status_code"],
+                        headers=CIMultiDictProxy(CIMultiDict(record["headers"])),
+                        content=(
+                            record["content"].encode("utf-8") if "content" in record
+                            else base64.b64decode(record["content_base64"])
+                        ),
+                        encoding=record["encoding"],
+                    )
+            except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+                # A capture interrupted mid write still replays everything before the torn record
+                pass
+        return responses
+
+    def replay(self, key: str) -> Optional[HttpResponse]:
+        if self.__responses is None:
+            self.__responses = self.load()
+        return self.__responses.get(key)
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class HttpClient(object):
+    KEEPALIVE_TIMEOUT: float = 30
+    DNS_CACHE_TTL: int = 300
+    CHUNK_SIZE: int = 64 * 1024
+    RETRY_BACKOFF: float = 1
+
+    def __init__(
+            self,
+            scheduler: Optional[RequestScheduler] = None,
+            keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+            cache: Optional[HttpCache] = None,
+            metrics: Optional[RequestMetrics] = None,
+            capture: Optional[CaptureStore] = None,
+            replay: Optional[CaptureStore] = None,
+            resolver: Optional[CachingResolver] = None,
+    ):
+        self.scheduler: RequestScheduler = scheduler or RequestScheduler()
+        self.keepalive_timeout: float = keepalive_timeout
+        self.cache: Optional[HttpCache] = cache
+        self.metrics: RequestMetrics = metrics or RequestMetrics()
+        self.capture: Optional[CaptureStore] = capture
+        self.replay: Optional[CaptureStore] = replay
+        self.resolver: Optional[CachingResolver] = resolver
+        self.__session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "HttpClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        if self.__session is not None and not self.__session.closed:
+            return
+        # Per-host caps are enforced by the scheduler, the pool only has to hold every allowed connection
+        # A shared resolver keeps its own positive and negative cache, the connector must not cache on top of it
+        connector = aiohttp.TCPConnector(
+            limit=self.scheduler.max_concurrency,
+            limit_per_host=0,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            use_dns_cache=self.resolver is None,
+            resolver=self.resolver,
+        )
+        # Cookies are passed explicitly per request, nothing should leak between services
+        self.__session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+
+    def warm_up(self, urls: Iterable[Optional[str]]) -> None:
+        # Hosts are resolved in the background while the listing is parsed, dead domains then fail without a request
+        if self.resolver is not None and self.replay is None:
+            self.resolver.warm_up(urls)
+
+    async def close(self) -> None:
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
+        self.__session = None
+
+    @staticmethod
+    def __format_params(params: Optional[Dict]) -> Optional[Dict]:
+        if params is None:
+            return None
+        return {
+            key: str(value) if isinstance(value, bool) else value for key, value in params.items() if value is not None
+        }
+
+    @staticmethod
+    def __format_timeout(timeout: Timeout) -> Optional[aiohttp.ClientTimeout]:
+        if timeout is None or isinstance(timeout, aiohttp.ClientTimeout):
+            return timeout
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def __read(self, response: aiohttp.ClientResponse, max_bytes: Optional[int]) -> bytes:
+        if max_bytes is None:
+            return await response.read()
+        chunks: list = []
+        size: int = 0
+        async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+        return b"".join(chunks)[:max_bytes]
+
+    def __get_retry_delay(self, response: HttpResponse, attempt: int) -> float:
+        retry_after: str = response.headers.get("Retry-After", "")
+        return float(retry_after) if retry_after.isdigit() else self.RETRY_BACKOFF * 2 ** attempt
+
+    async def __send(
+            self,
+            method: str,
+            url: str,
+            stage: str,
+            max_bytes: Optional[int] = None,
+            content_types: Optional[Tuple[str, ...]] = None,
+            **kwargs,
+    ) -> HttpResponse:
+        # Tasks left over from a failed event must not reopen a session the owner has already closed
+        if self.__session is None or self.__session.closed:
+            raise RuntimeError("HttpClient is closed, open it with open() or async with")
+        host: Optional[str] = urlsplit(url).hostname
+        if self.resolver is not None and self.resolver.is_unresolvable(host):
+            raise aiohttp.ClientConnectionError(f"Cannot resolve host {host}")
+        queued_at: float = time.monotonic()
+        async with self.scheduler.slot(url):
+            started_at: float = time.monotonic()
+            try:
+                async with self.__session.request(method, url, **kwargs) as response:
+                    # Bodies of unwanted types are never read, leaving the block drops the connection.
+                    # aiohttp reports a missing Content-Type as octet-stream, such answers are still read
+                    skip_body: bool = (
+                        content_types is not None and "Content-Type" in response.headers
+                        and not response.content_type.startswith(content_types)
+                    )
+                    content: bytes = b"" if skip_body else await self.__read(response, max_bytes)
+            except (asyncio.TimeoutError, aiohttp.ClientError) as exc:
+                self.metrics.record_failure(
+                    stage, url, time.monotonic() - started_at, started_at - queued_at,
+                    timeout=isinstance(exc, asyncio.TimeoutError),
+                )
+                raise
+            self.metrics.record_response(
+                stage, url, response.status, len(content), time.monotonic() - started_at, started_at - queued_at
+            )
+            return HttpResponse(
+                url=str(response.url),
+                status_code=response.status,
+                headers=response.headers,
+                content=content,
+                encoding=response.charset,
+            )
+
+    async def __send_cached(
+            self, url: str, stage: str, params: Optional[Dict], headers: Optional[Dict], **kwargs
+    ) -> HttpResponse:
+        key: str = self.cache.make_key(url, params)
+        cached_response: Optional[CachedResponse] = self.cache.get(key)
+        if cached_response is not None and self.cache.is_fresh(url, cached_response):
+            self.metrics.record_cache_hit(stage, url)
+            return cached_response.response
+
+        headers = dict(headers or {})
+        if cached_response is not None and cached_response.etag:
+            headers["If-None-Match"] = cached_response.etag
+        if cached_response is not None and cached_response.last_modified:
+            headers["If-Modified-Since"] = cached_response.last_modified
+
+        response: HttpResponse = await self.__send("GET", url, stage, params=params, headers=headers, **kwargs)
+        if response.status_code == 304 and cached_response is not None:
+            self.metrics.record_cache_hit(stage, url)
+            self.cache.revalidate(key)
+            return cached_response.response
+        if response.status_code == 200:
+            self.cache.set(key, response)
+        return response
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            params: Optional[Dict] = None,
+            data: Any = None,
+            json: Any = None,
+            headers: Optional[Dict] = None,
+            cookies: Optional[Dict] = None,
+            timeout: Timeout = None,
+            allow_redirects: bool = True,
+            cached: bool = False,
+            stage: str = DEFAULT_STAGE,
+            max_bytes: Optional[int] = None,
+            content_types: Optional[Tuple[str, ...]] = None,
+            retries: int = 0,
+    ) -> HttpResponse:
+        params = self.__format_params(params)
+        key: Optional[str] = (
+            CaptureStore.make_key(method, url, params, data, json)
+            if self.capture is not None or self.replay is not None else None
+        )
+        if self.replay is not None:
+            # Formatting from a capture must never reach the network, a request missing from it fails like one
+            replayed_response: Optional[HttpResponse] = self.replay.replay(key)
+            if replayed_response is None:
+                raise aiohttp.ClientConnectionError(f"No captured response for {method} {url}")
+            return replayed_response
+
+        kwargs: dict = {
+            "cookies": cookies,
+            "allow_redirects": allow_redirects,
+            "max_bytes": max_bytes,
+            "content_types": content_types,
+        }
+        if timeout is not None:
+            kwargs["timeout"] = self.__format_timeout(timeout)
+
+        # Throttled and failed answers are retried, only the last one is returned and captured
+        for attempt in range(retries + 1):
+            if cached and method == "GET" and self.cache is not None:
+                response: HttpResponse = await self.__send_cached(url, stage, params, headers, **kwargs)
+            else:
+                response: HttpResponse = await self.__send(
+                    method, url, stage, params=params, data=data, json=json, headers=headers, **kwargs
+                )
+            if response.status_code != 429 and response.status_code < 500 or attempt == retries:
+                break
+            self.metrics.record_retry(stage, url)
+            await asyncio.sleep(self.__get_retry_delay(response, attempt))
+        if self.capture is not None:
+            self.capture.append(key, stage, response)
+        return response
+
+    async def get(self, url: str, **kwargs) -> HttpResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> HttpResponse:
+        return await self.request("POST", url, **kwargs)
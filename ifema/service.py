@@ -1,80 +1,112 @@
 import asyncio
-from typing import Tuple, List, Dict
-
-import requests
-from requests import Response
+from functools import partial
+from typing import AsyncIterator, Tuple, List, Dict, Optional
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
 from services import WhatsappService
-from tools import parsing_emails_from_website
+from tools import ContactCrawler, parsing_emails_from_website
 
 
 class IFemaParseService(AbstractParseService):
     IFema_API_URL: str = "https://lc-events-web-public.ifema.es/api/v1"
     DEFAULT_COUNTRY_PHONE_CODE: str = "34"
-
-    def __init__(self, tenant_id: str, edition_id: str, whatsapp: WhatsappService):
+    MAX_EXHIBITORS_PER_REQUEST: int = 1000
+    # Details share the API host with the search, the scheduler's per-host limit (10 by default) caps both anyway
+    MAX_CONCURRENT_DETAILS: int = 10
+    MAX_RETRIES: int = 3
+
+    def __init__(
+            self,
+            tenant_id: str,
+            edition_id: str,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+            max_concurrent_details: int = MAX_CONCURRENT_DETAILS,
+    ):
         self.tenant_id: str = tenant_id
         self.edition_id: str = edition_id
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
+        self.__details_semaphore = asyncio.Semaphore(max_concurrent_details)
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
         return "Name", "Country", "Current Email", "Emails", "Website"
 
-    def __format_phone_number(self, phone_number: str) -> str:
-        if not phone_number:
-            return phone_number
-
-        # +(xxx or xx) xx xxx-xx-xx !!! min 11 chars
-        phone_number: str = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-
-        return self.DEFAULT_COUNTRY_PHONE_CODE + phone_number if not 11 <= len(phone_number) else phone_number
-
     @staticmethod
     def __format_website(url: str) -> str:
         if not isinstance(url, str):
             return url
         return url if url[:8] == "https://" or url[:7] == "http://" else "https://" + url
 
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
-        exhibitors = [
-            exhibitor | {
-                "Emails": asyncio.create_task(parsing_emails_from_website(self.__format_website(exhibitor["link"])))
-            } for exhibitor in exhibitors
-        ]
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
+        website: str = self.__format_website(exhibitor["link"])
         return [
-            [
-                exhibitor["name"],
-                exhibitor["country"],
-                exhibitor["email"],
-                await exhibitor["Emails"],
-                self.__format_website(exhibitor["link"]),
-            ] for exhibitor in exhibitors
+            exhibitor["name"],
+            exhibitor["country"],
+            exhibitor["email"],
+            await parsing_emails_from_website(self.client, website, self.index, self.crawler),
+            website,
         ]
 
     async def __parse_detail_exhibitor(self, exhibitor_id: str) -> Dict:
         url: str = f"{self.IFema_API_URL}/tenants/{self.tenant_id}/editions/{self.edition_id}/exhibitors/{exhibitor_id}"
-        request: Response = await asyncio.to_thread(requests.get, url=url)
+        async with self.__details_semaphore:
+            request: HttpResponse = await self.client.get(url, cached=True, stage="detail", retries=self.MAX_RETRIES)
+        # A row without its detail has no name or website, the event fails and a resumed run asks again
+        if request.status_code != 200:
+            raise RuntimeError(f"IFEMA exhibitor {exhibitor_id} detail failed with status {request.status_code}")
+        exhibitor: Dict = request.json()
         return {
-            "name": request.json()["name"],
-            "country": request.json()["location"]["countryCode"],
-            "link": request.json()["link"],
-        } if request.status_code == 200 else []
-
-    async def __parse_exhibitors(self) -> List:
+            "name": exhibitor["name"],
+            "country": exhibitor["location"]["countryCode"],
+            "link": exhibitor["link"],
+        }
+
+    async def __parse_exhibitor(self, exhibitor: Dict) -> List:
+        detail: Dict = await self._checkpoint(
+            "detail", exhibitor["id"], lambda: self.__parse_detail_exhibitor(exhibitor["id"])
+        )
+        return await self.__format_exhibitor_data(detail | {"email": exhibitor["email"]})
+
+    async def __parse_page(self, page: int) -> List:
         url: str = self.IFema_API_URL + f"/tenants/{self.tenant_id}/editions/{self.edition_id}/exhibitors/search"
-        data: dict = {"page": 0, "pageSize": 1000}
+        data: dict = {"page": page, "pageSize": self.MAX_EXHIBITORS_PER_REQUEST}
 
-        request: Response = await asyncio.to_thread(requests.post, url=url, json=data)
-        exhibitors: list = []
-        for ls in request.json()["data"]:
-            exh_det = await self.__parse_detail_exhibitor(ls["id"])
-            exhibitors.append(exh_det | {"email": ls["email"]})
-        return await self.__format_exhibitors_data(exhibitors) if request.status_code == 200 else []
+        request: HttpResponse = await self.client.post(url, json=data, stage="listing", retries=self.MAX_RETRIES)
+        # A failed page must not read as the short last page, that would silently cut the edition
+        if request.status_code != 200:
+            raise RuntimeError(f"IFEMA search page {page} failed with status {request.status_code}")
+        return request.json()["data"]
 
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        exhibitors: list = []
+        page: int = 0
+        while True:
+            exhibitors_per_page: List = await self._checkpoint("page", page, partial(self.__parse_page, page))
+            exhibitors.extend(exhibitors_per_page)
+            # The search answer has no total, a short page is the last one
+            if len(exhibitors_per_page) < self.MAX_EXHIBITORS_PER_REQUEST:
+                break
+            page += 1
+
+        async for exhibitor in self._yield_as_completed(
+                self._checkpoint("row", exhibitor["id"], partial(self.__parse_exhibitor, exhibitor))
+                for exhibitor in exhibitors
+        ):
+            yield exhibitor
+
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_STAGE: str = "default"
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _StageHostMetrics(object):
+    def __init__(self):
+        self.requests: int = 0
+        self.statuses: Dict[int, int] = defaultdict(int)
+        self.bytes: int = 0
+        self.retries: int = 0
+        self.timeouts: int = 0
+        self.errors: int = 0
+        self.cache_hits: int = 0
+        self.wait_seconds: float = 0
+        self.latency_sum: float = 0
+        self.latency_buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe_latency(self, latency: float) -> None:
+        self.latency_sum += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_buckets[i] += 1
+                return
+        self.latency_buckets[-1] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "latency_seconds": {
+                "sum": round(self.latency_sum, 6),
+                "count": sum(self.latency_buckets),
+                "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], self.latency_buckets)),
+            },
+        }
+
+
+class RequestMetrics(object):
+    PROMETHEUS_PREFIX: str = "dataparsers_http"
+
+    def __init__(self):
+        self.started_at: float = time.time()
+        self.__metrics: Dict[Tuple[str, str], _StageHostMetrics] = defaultdict(_StageHostMetrics)
+
+    @staticmethod
+    def get_host(url: str) -> str:
+        return urlsplit(url).hostname or ""
+
+    def __get(self, stage: str, url: str) -> _StageHostMetrics:
+        return self.__metrics[(stage, self.get_host(url))]
+
+    def record_response(self, stage: str, url: str, status: int, size: int, latency: float, wait: float) -> None:
+        metrics: _StageHostMetrics = self.__get(stage, url)
+        metrics.requests += 1
+        metrics.statuses[status] += 1
+        metrics.bytes += size
+        metrics.wait_seconds += wait
+        metrics.observe_latency(latency)
+
+    def record_failure(self, stage: str, url: str, latency: float, wait: float, timeout: bool) -> None:
+        metrics: _StageHostMetrics = self.__get(stage, url)
+        metrics.requests += 1
+        metrics.wait_seconds += wait
+        if timeout:
+            metrics.timeouts += 1
+        else:
+            metrics.errors += 1
+        metrics.observe_latency(latency)
+
+    def record_retry(self, stage: str, url: str) -> None:
+        self.__get(stage, url).retries += 1
+
+    def record_cache_hit(self, stage: str, url: str) -> None:
+        self.__get(stage, url).cache_hits += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "started_at": self.started_at,
+            "duration_seconds": round(time.time() - self.started_at, 6),
+            "requests": [
+                {"stage": stage, "host": host} | metrics.to_dict()
+                for (stage, host), metrics in sorted(self.__metrics.items())
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        prefix: str = self.PROMETHEUS_PREFIX
+        counters: Dict[str, Tuple[str, Callable[[_StageHostMetrics], float]]] = {
+            "requests": ("Requests sent", lambda metrics: metrics.requests),
+            "response_bytes": ("Response body bytes received", lambda metrics: metrics.bytes),
+            "retries": ("Requests retried after a throttled or failed answer", lambda metrics: metrics.retries),
+            "timeouts": ("Requests that timed out", lambda metrics: metrics.timeouts),
+            "errors": ("Requests that failed without a response", lambda metrics: metrics.errors),
+            "cache_hits": ("Requests answered from the local cache", lambda metrics: metrics.cache_hits),
+            "wait_seconds": (
+                "Seconds spent waiting for a scheduler slot", lambda metrics: round(metrics.wait_seconds, 6)
+            ),
+        }
+        lines: List[str] = []
+        for name, (description, get_value) in counters.items():
+            lines += [f"# HELP {prefix}_{name}_total {description}", f"# TYPE {prefix}_{name}_total counter"]
+            for (stage, host), metrics in sorted(self.__metrics.items()):
+                lines.append(f'{prefix}_{name}_total{{stage="{stage}",host="{host}"}} {get_value(metrics)}')
+
+        lines += [
+            f"# HELP {prefix}_responses_total Responses by status code",
+            f"# TYPE {prefix}_responses_total counter",
+        ]
+        for (stage, host), metrics in sorted(self.__metrics.items()):
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(f'{prefix}_responses_total{{stage="{stage}",host="{host}",status="{status}"}} {count}')
+
+        lines += [
+            f"# HELP {prefix}_latency_seconds Request latency once a scheduler slot is held",
+            f"# TYPE {prefix}_latency_seconds histogram",
+        ]
+        for (stage, host), metrics in sorted(self.__metrics.items()):
+            labels: str = f'stage="{stage}",host="{host}"'
+            cumulative: int = 0
+            for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], metrics.latency_buckets):
+                cumulative += count
+                lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}_latency_seconds_sum{{{labels}}} {round(metrics.latency_sum, 6)}")
+            lines.append(f"{prefix}_latency_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def __write(path: str, content: str) -> None:
+        # The textfile collector may read at any moment, never let it see a half written file
+        directory: str = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        temporary_path: str = path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+
+    def write_report(self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None) -> None:
+        if json_path:
+            self.__write(json_path, json.dumps(self.to_dict(), indent=2))
+        if prometheus_path:
+            self.__write(prometheus_path, self.to_prometheus())
@@ -1,15 +1,36 @@
-import asyncio
 import json
-from typing import List, Tuple, Dict
+from functools import partial
+from typing import AsyncIterator, List, Tuple, Dict, Optional
+from urllib.parse import urlencode
 
-import requests
 from bs4 import BeautifulSoup
 from lxml import html
-from requests import Response
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
+from parsing_pool import parse_in_pool
+from phone_numbers import normalize_phone_number, validate_phone_number
 from services import WhatsappService
-from tools import validate_phone_number, validate_email, parsing_emails_from_website
+from tools import ContactCrawler, parsing_emails_from_website, validate_email
+
+
+def _parse_exhibitor_contacts(content: bytes) -> Dict:
+    parsed_data: dict = {"phone_number": None, "email": None, "website": None}
+    tree = html.fromstring(content)
+    hrefs: list = [href for href in tree.xpath('//*[@id="exhibitor-container"]/aside/div/ul/li/a')]
+    for href in hrefs:
+        try:
+            if validate_phone_number(href.attrib["href"].split(":")[1]) and not parsed_data["phone_number"]:
+                parsed_data["phone_number"] = href.attrib["href"].split(":")[1]
+            elif validate_email(href.attrib["href"].split(":")[1]) and not parsed_data["email"]:
+                parsed_data["email"] = href.attrib["href"].split(":")[1]
+            else:
+                parsed_data["website"] = href.attrib['href']
+        except:
+            continue
+    return parsed_data
 
 
 class MVCBarcelonaParseService(AbstractParseService):
@@ -17,121 +38,118 @@ class MVCBarcelonaParseService(AbstractParseService):
     ALGOLIA_API_URl: str = "https://8vvb6vr33k-dsn.algolia.net/"
     DEFAULT_COUNTRY_PHONE_CODE: str = "34"
     MAX_EXHIBITORS_PER_REQUEST: int = 1000
-
-    def __init__(self, algolia_api_key: str, algolia_application_id: str, whatsapp: WhatsappService):
+    PAGES_PER_REQUEST: int = 10
+    ATTRIBUTES_TO_RETRIEVE: List[str] = ["name", "country", "url"]
+
+    def __init__(
+            self,
+            algolia_api_key: str,
+            algolia_application_id: str,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+    ):
         self.algolia_api_key: str = algolia_api_key
         self.algolia_application_id: str = algolia_application_id
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
         return "Name", "Country", "Whatsapp link", "Telephone", "Current Email", "Website Emails", "Website", "Detail"
 
-    def __format_phone_number(self, phone_number: str) -> str:
-        if not phone_number:
-            return phone_number
-
-        # +(xxx or xx) xx xxx-xx-xx !!! min 11 chars
-        phone_number: str = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-
-        return self.DEFAULT_COUNTRY_PHONE_CODE + phone_number if not 11 <= len(phone_number) else phone_number
+    def __format_phone_number(self, phone_number: str, country: Optional[str] = None) -> Optional[str]:
+        return normalize_phone_number(phone_number, country, self.DEFAULT_COUNTRY_PHONE_CODE)
 
     async def __parse_mvc_barcelona_html(self, url: str) -> Dict:
         parsed_data: dict = {"phone_number": None, "email": None, "website": None}
         if not url:
             return parsed_data
         url: str = self.MVCBarcelona_URL + url[1:]
-        print(f"Parse Detail {url}")
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
         }
         try:
-            request: Response = await asyncio.to_thread(
-                requests.get, url=url, headers=headers, allow_redirects=False, timeout=(3, 5)
+            request: HttpResponse = await self.client.get(
+                url, headers=headers, allow_redirects=False, timeout=(3, 5), stage="detail"
             )
         except:
             return parsed_data
-        tree = html.fromstring(request.content)
-        hrefs: list = [href for href in tree.xpath('//*[@id="exhibitor-container"]/aside/div/ul/li/a')]
-        for href in hrefs:
-            try:
-                if validate_phone_number(href.attrib["href"].split(":")[1]) and not parsed_data["phone_number"]:
-                    parsed_data["phone_number"] = href.attrib["href"].split(":")[1]
-                elif validate_email(href.attrib["href"].split(":")[1]) and not parsed_data["email"]:
-                    parsed_data["email"] = href.attrib["href"].split(":")[1]
-                else:
-                    parsed_data["website"] = href.attrib['href']
-            except:
-                continue
-        print(f"Stop Parse Detail {url} {request.status_code}")
+        parsed_data = await parse_in_pool(_parse_exhibitor_contacts, request.content)
         return parsed_data
 
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
-        exhibitors = [
-            exhibitor | {
-                "contactData":
-                asyncio.create_task(
-                    self.__parse_mvc_barcelona_html(exhibitor["url"])
-                )
-            }
-            for exhibitor in exhibitors
-        ]
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
+        contact_data: Dict = await self.__parse_mvc_barcelona_html(exhibitor["url"])
+        # The website only comes with the detail page, it still resolves while the WhatsApp lookup runs
+        self.client.warm_up([contact_data["website"]])
         return [
-            [
-                exhibitor["name"],
-                exhibitor["country"],
-                await self.whatsapp.format_to_whatsapp_link(
-                    self.__format_phone_number(
-                        (await exhibitor["contactData"])["phone_number"]
-                    )
-                ),
-                (await exhibitor["contactData"])["phone_number"],
-                (await exhibitor["contactData"])["email"],
-                await parsing_emails_from_website((await exhibitor["contactData"])["website"]),
-                (await exhibitor["contactData"])["website"],
-                self.MVCBarcelona_URL + exhibitor["url"][1:] if exhibitor["url"] else None,
-            ] for exhibitor in exhibitors
+            exhibitor["name"],
+            exhibitor["country"],
+            await self.whatsapp.format_to_whatsapp_link(
+                self.__format_phone_number(contact_data["phone_number"], exhibitor["country"])
+            ),
+            contact_data["phone_number"],
+            contact_data["email"],
+            await parsing_emails_from_website(self.client, contact_data["website"], self.index, self.crawler),
+            contact_data["website"],
+            self.MVCBarcelona_URL + exhibitor["url"][1:] if exhibitor["url"] else None,
         ]
 
-    async def __get_number_of_required_requests(self) -> int:
-        url: str = self.ALGOLIA_API_URl + "1/indexes/*/queries"
+    def __build_query(self, page: int) -> Dict:
         params: dict = {
-            "x-algolia-api-key": self.algolia_api_key,
-            "x-algolia-application-id": self.algolia_application_id
+            "hitsPerPage": self.MAX_EXHIBITORS_PER_REQUEST,
+            "page": page,
+            "attributesToRetrieve": json.dumps(self.ATTRIBUTES_TO_RETRIEVE),
         }
-        request_data_params: str = f"hitsPerPage={self.MAX_EXHIBITORS_PER_REQUEST}"
-        data: dict = {
-            "requests": [{"indexName": "exhibitors-default", "params": request_data_params}]
-        }
-
-        request: Response = await asyncio.to_thread(requests.post, url=url, data=json.dumps(data), params=params)
-        return request.json()["results"][0]["nbPages"] if request.status_code == 200 else 0
+        return {"indexName": "exhibitors-default", "params": urlencode(params)}
 
-    async def __parse_exhibitors(self) -> List:
-        exhibitors_list: list = []
+    async def __search(self, pages: List[int]) -> List[Dict]:
         url: str = self.ALGOLIA_API_URl + "1/indexes/*/queries"
         params: dict = {
             "x-algolia-api-key": self.algolia_api_key,
             "x-algolia-application-id": self.algolia_application_id
         }
+        data: dict = {"requests": [self.__build_query(page) for page in pages]}
 
-        for _ in range(1):
-            print(f"Page {_ + 1}")
-            request_data_params: str = f"hitsPerPage={self.MAX_EXHIBITORS_PER_REQUEST}&page={3}"
-            data: dict = {
-                "requests": [{"indexName": "exhibitors-default", "params": request_data_params}]
-            }
-            request: Response = await asyncio.to_thread(requests.post, url=url, data=json.dumps(data), params=params)
-            exhibitors_list.extend(
-                await self.__format_exhibitors_data(
-                    request.json()["results"][0]["hits"]
-                ) if request.status_code == 200 else []
-            )
+        request: HttpResponse = await self.client.post(url, data=json.dumps(data), params=params, stage="listing")
+        return request.json()["results"] if request.status_code == 200 else []
+
+    async def __parse_first_page(self) -> Dict:
+        results: List[Dict] = await self.__search([0])
+        return {"hits": results[0]["hits"], "nbPages": results[0]["nbPages"]} if results else {}
+
+    async def __parse_pages(self, pages: List[int]) -> List:
+        return [hit for result in await self.__search(pages) for hit in result["hits"]]
 
-        return exhibitors_list
+    async def __parse_pages_hits(self, pages: List[int]) -> List:
+        return await self._checkpoint("page", f"{pages[0]}-{pages[-1]}", partial(self.__parse_pages, pages))
+
+    async def __parse_row(self, exhibitor: Dict) -> List:
+        return await self._checkpoint("row", exhibitor["objectID"], partial(self.__format_exhibitor_data, exhibitor))
+
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        page: Dict = await self._checkpoint("page", 0, self.__parse_first_page)
+        count: int = page.get("nbPages", 0)
+
+        print(f"Pages: {count}")
+
+        # Several page queries share one multi-query request, the requests themselves run concurrently
+        batches: list = [
+            list(range(first, min(first + self.PAGES_PER_REQUEST, count)))
+            for first in range(1, count, self.PAGES_PER_REQUEST)
+        ]
+        async for exhibitor in self._yield_pipelined(
+                self.__parse_row, pages=map(self.__parse_pages_hits, batches), items=page.get("hits", [])
+        ):
+            yield exhibitor
 
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Type, Union
+
+from abstract import AbstractParseService
+from cache import ExhibitorIndex, WhatsappCache
+from cantonfair.service import CantonfairParseService
+from checkpoint import CheckpointStore
+from eccmid.service import EccmidParseService
+from exporters import EXPORTERS, AbstractExporter, ExcelExporter
+from firabarcelona.service import FiraBarcelonaParseService
+from http_client import CaptureStore, HttpCache, HttpClient
+from ifema.service import IFemaParseService
+from metrics import RequestMetrics
+from mwcbarcelona.service import MVCBarcelonaParseService
+from parsing_pool import shutdown_parsing_pool, start_parsing_pool
+from publicalt.service import PublicaltParseService
+from resolver import CachingResolver
+from scheduler import HostLimit, RequestScheduler
+from services import WhatsappService
+from ticketsnebext.service import TicketsNebextParseService
+from tools import ContactCrawler, cancel_website_lookups
+
+SERVICES: Dict[str, Type[AbstractParseService]] = {
+    "cantonfair": CantonfairParseService,
+    "eccmid": EccmidParseService,
+    "firabarcelona": FiraBarcelonaParseService,
+    "ifema": IFemaParseService,
+    "mwcbarcelona": MVCBarcelonaParseService,
+    "publicalt": PublicaltParseService,
+    "ticketsnebext": TicketsNebextParseService,
+}
+
+
+def load_config(path: str) -> Dict:
+    extension: str = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    if extension == ".toml":
+        import tomllib
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    if extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("PyYAML is required to read YAML configs, install it or use JSON/TOML") from None
+        with open(path, encoding="utf-8") as file:
+            return yaml.safe_load(file)
+    raise ValueError(f"Unsupported config format: {path}")
+
+
+class EventOrchestrator(object):
+    DEFAULT_FORMAT: str = ExcelExporter.EXTENSION
+    DEFAULT_OUTPUT_DIR: str = "."
+    DEFAULT_METRICS_NAME: str = "metrics"
+
+    def __init__(self, config: Dict):
+        self.config: Dict = config
+        self.output_dir: str = config.get("output_dir", self.DEFAULT_OUTPUT_DIR)
+        self.run_id: Optional[str] = config.get("run_id")
+        # The format phase rebuilds exports from the capture of an earlier run without touching the network
+        self.replay_id: Optional[str] = config.get("replay")
+        self.capture_dir: str = config.get("capture_dir", CaptureStore.DEFAULT_DIRECTORY)
+
+    def __get_options(self, name: str) -> Optional[Dict]:
+        # A component is either true/false or a table of its options, a missing entry keeps it on with defaults
+        options: Union[bool, Dict] = self.config.get(name, True)
+        if options is False:
+            return None
+        return options if isinstance(options, dict) else {}
+
+    def __create_scheduler(self) -> RequestScheduler:
+        config: Dict = self.config.get("scheduler", {})
+        default_host_limit: Dict = config.get("default_host_limit", RequestScheduler.DEFAULT_HOST_LIMIT._asdict())
+        return RequestScheduler(
+            max_concurrency=config.get("max_concurrency", RequestScheduler.MAX_CONCURRENCY),
+            default_host_limit=HostLimit(**default_host_limit),
+            host_limits={host: HostLimit(**limit) for host, limit in config.get("host_limits", {}).items()},
+        )
+
+    def __create_exporter(self, event: Dict, service: AbstractParseService) -> AbstractExporter:
+        extension: str = event.get("format", self.DEFAULT_FORMAT)
+        filename: str = os.path.join(self.output_dir, f"{event['name']}_{str(uuid.uuid4())[:6]}.{extension}")
+        options: Dict[str, Any] = event.get("exporter", {})
+        if extension == ExcelExporter.EXTENSION:
+            options = {"sheet_name": event["name"]} | options
+        return EXPORTERS[extension](filename, service.get_parsed_data_names(), **options)
+
+    async def __run_event(
+            self,
+            event: Dict,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            index: Optional[ExhibitorIndex],
+            crawler: Optional[ContactCrawler],
+    ) -> str:
+        checkpoint: Optional[CheckpointStore] = (
+            CheckpointStore(f"{self.run_id}:{event['name']}") if self.run_id and not self.replay_id else None
+        )
+        service: AbstractParseService = SERVICES[event["service"]](
+            **event.get("params", {}),
+            whatsapp=whatsapp,
+            client=client,
+            checkpoint=checkpoint,
+            index=index,
+            crawler=crawler,
+        )
+        exporter: AbstractExporter = self.__create_exporter(event, service)
+        try:
+            await exporter.export(service)
+        finally:
+            await asyncio.to_thread(exporter.close)
+            if checkpoint is not None:
+                checkpoint.close()
+        return exporter.filename
+
+    async def run(self) -> Dict[str, Any]:
+        events: List[Dict] = [event for event in self.config["events"] if event.get("enabled", True)]
+        os.makedirs(self.output_dir, exist_ok=True)
+        whatsapp_config: Dict = self.config["whatsapp"]
+        replay: Optional[CaptureStore] = CaptureStore(self.replay_id, self.capture_dir) if self.replay_id else None
+        capture: Optional[CaptureStore] = (
+            CaptureStore(self.run_id or time.strftime("%Y%m%d-%H%M%S"), self.capture_dir)
+            if self.config.get("capture", False) and replay is None else None
+        )
+        # Rows of a capture must be rebuildable from it alone, so capture and replay never read the local stores
+        isolated: bool = capture is not None or replay is not None
+        whatsapp_cache: Optional[WhatsappCache] = WhatsappCache() if not isolated else None
+        http_cache_options: Optional[Dict] = self.__get_options("http_cache")
+        http_cache: Optional[HttpCache] = HttpCache(**http_cache_options) if http_cache_options is not None else None
+        index: Optional[ExhibitorIndex] = (
+            ExhibitorIndex() if self.config.get("exhibitor_index", True) and not isolated else None
+        )
+        # Following contact and legal pages is opt-in, it costs up to max_pages requests per website
+        crawler: Optional[ContactCrawler] = (
+            ContactCrawler(**self.config["crawler"]) if self.config.get("crawler") else None
+        )
+        # DNS answers, good and bad, are shared by every event, resolver = false falls back to aiohttp's own cache
+        resolver_options: Optional[Dict] = self.__get_options("resolver")
+        resolver: Optional[CachingResolver] = (
+            CachingResolver(**resolver_options) if resolver_options is not None else None
+        )
+        metrics = RequestMetrics()
+
+        try:
+            # One connection pool, WhatsApp cache, exhibitor index, crawler and concurrency budget for every event
+            async with HttpClient(
+                    scheduler=self.__create_scheduler(),
+                    cache=http_cache,
+                    metrics=metrics,
+                    capture=capture,
+                    replay=replay,
+                    resolver=resolver,
+            ) as client:
+                # A replayed answer is already in memory, waiting on the rate limit or a retry backoff gains nothing
+                whatsapp = WhatsappService(
+                    whatsapp_config["id_instance"],
+                    whatsapp_config["api_token_instance"],
+                    client,
+                    whatsapp_cache,
+                    requests_per_second=None if replay is not None else WhatsappService.REQUESTS_PER_SECOND,
+                    max_retries=0 if replay is not None else WhatsappService.MAX_RETRIES,
+                )
+                try:
+                    results: list = await asyncio.gather(
+                        *[self.__run_event(event, whatsapp, client, index, crawler) for event in events],
+                        return_exceptions=True,
+                    )
+                finally:
+                    whatsapp.close()
+                    cancel_website_lookups(client)
+        finally:
+            if whatsapp_cache is not None:
+                whatsapp_cache.close()
+            shutdown_parsing_pool()
+            if capture is not None:
+                capture.close()
+                print(f"Captured responses to {capture.path}")
+            if http_cache is not None:
+                http_cache.close()
+            if index is not None:
+                index.close()
+            if resolver is not None:
+                await resolver.close()
+            # A node_exporter textfile directory can point at the .prom file directly
+            metrics_name: str = self.config.get("metrics_name", self.DEFAULT_METRICS_NAME)
+            metrics_path: str = os.path.join(self.output_dir, metrics_name)
+            metrics.write_report(json_path=metrics_path + ".json", prometheus_path=metrics_path + ".prom")
+
+        for event, result in zip(events, results):
+            if isinstance(result, BaseException):
+                print(f"Event {event['name']} failed: {result!r}")
+            else:
+                print(f"Event {event['name']} exported to {result}")
+        return {event["name"]: result for event, result in zip(events, results)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parse several events concurrently from one config file")
+    parser.add_argument("config", help="path to a YAML, JSON or TOML config")
+    parser.add_argument("--run-id", help="checkpoint run id, reuse it to resume an interrupted run")
+    parser.add_argument("--capture", action="store_true", help="store every raw response of this run")
+    parser.add_argument("--replay", metavar="RUN_ID", help="rebuild exports from a capture, without network")
+    args = parser.parse_args()
+
+    config: Dict = load_config(args.config)
+    if args.run_id:
+        config["run_id"] = args.run_id
+    if args.capture:
+        config["capture"] = True
+    if args.replay:
+        config["replay"] = args.replay
+    start_parsing_pool()
+    asyncio.run(EventOrchestrator(config).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Pickling a small page to a worker costs more than parsing it on the loop
+INLINE_PARSE_LIMIT: int = 32 * 1024
+
+PARSING_WORKERS: int = os.cpu_count() or 1
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def get_parsing_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=PARSING_WORKERS)
+    return _POOL
+
+
+def start_parsing_pool() -> None:
+    # Workers are forked on demand, a fork inside the running loop would copy a process that already has
+    # exporter and resolver threads and can deadlock. Call this before asyncio.run to fork them all up front
+    pool: ProcessPoolExecutor = get_parsing_pool()
+    for future in [pool.submit(os.getpid) for _ in range(PARSING_WORKERS)]:
+        future.result()
+
+
+def shutdown_parsing_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(cancel_futures=True)
+        _POOL = None
+
+
+async def parse_in_pool(parse: Callable[[bytes], T], content: bytes) -> T:
+    # parse has to be a module level function, only the raw bytes and the extracted fields cross processes
+    if len(content) < INLINE_PARSE_LIMIT:
+        return parse(content)
+    return await asyncio.get_running_loop().run_in_executor(get_parsing_pool(), parse, content)
@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_CALLING_CODE: str = "34"
+CACHE_SIZE: int = 64 * 1024
+# E.164 numbers are written here without the leading "+", the form wa.me and Green API expect
+MIN_NUMBER_LENGTH: int = 8
+MAX_NUMBER_LENGTH: int = 15
+# Longer national numbers are taken to already carry a country calling code
+NATIONAL_NUMBER_MAX_LENGTH: int = 10
+NATIONAL_NUMBER_MAX_LENGTHS: Dict[str, int] = {"49": 11, "86": 11}
+# Countries whose leading zero is part of the number, not a trunk prefix
+KEEP_LEADING_ZERO_CALLING_CODES: frozenset = frozenset({"39"})
+
+PHONE_NUMBER_PATTERN = re.compile(r"(\+\d{1,3})?\s?\(?\d{1,4}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
+
+COUNTRY_CALLING_CODES: Dict[str, str] = {
+    "AD": "376", "AE": "971", "AL": "355", "AM": "374", "AR": "54", "AT": "43", "AU": "61", "AZ": "994",
+    "BA": "387", "BD": "880", "BE": "32", "BG": "359", "BH": "973", "BO": "591", "BR": "55", "BY": "375",
+    "CA": "1", "CH": "41", "CL": "56", "CN": "86", "CO": "57", "CR": "506", "CU": "53", "CY": "357",
+    "CZ": "420", "DE": "49", "DK": "45", "DO": "1", "DZ": "213", "EC": "593", "EE": "372", "EG": "20",
+    "ES": "34", "FI": "358", "FR": "33", "GB": "44", "GE": "995", "GR": "30", "GT": "502", "HK": "852",
+    "HR": "385", "HU": "36", "ID": "62", "IE": "353", "IL": "972", "IN": "91", "IQ": "964", "IR": "98",
+    "IS": "354", "IT": "39", "JO": "962", "JP": "81", "KE": "254", "KR": "82", "KW": "965", "KZ": "7",
+    "LB": "961", "LI": "423", "LK": "94", "LT": "370", "LU": "352", "LV": "371", "MA": "212", "MC": "377",
+    "MD": "373", "ME": "382", "MK": "389", "MO": "853", "MT": "356", "MX": "52", "MY": "60", "NG": "234",
+    "NL": "31", "NO": "47", "NZ": "64", "OM": "968", "PA": "507", "PE": "51", "PH": "63", "PK": "92",
+    "PL": "48", "PT": "351", "PY": "595", "QA": "974", "RO": "40", "RS": "381", "RU": "7", "SA": "966",
+    "SE": "46", "SG": "65", "SI": "386", "SK": "421", "SM": "378", "SV": "503", "TH": "66", "TN": "216",
+    "TR": "90", "TW": "886", "UA": "380", "US": "1", "UY": "598", "UZ": "998", "VE": "58", "VN": "84",
+    "ZA": "27",
+}
+
+COUNTRY_NAMES: Dict[str, str] = {
+    "andorra": "AD", "united arab emirates": "AE", "emiratos arabes unidos": "AE", "albania": "AL",
+    "armenia": "AM", "argentina": "AR", "austria": "AT", "australia": "AU", "azerbaijan": "AZ",
+    "bosnia and herzegovina": "BA", "bangladesh": "BD", "belgium": "BE", "belgica": "BE", "bulgaria": "BG",
+    "bahrain": "BH", "bolivia": "BO", "brazil": "BR", "brasil": "BR", "belarus": "BY", "canada": "CA",
+    "switzerland": "CH", "suiza": "CH", "chile": "CL", "china": "CN", "colombia": "CO", "costa rica": "CR",
+    "cuba": "CU", "cyprus": "CY", "chipre": "CY", "czech republic": "CZ", "czechia": "CZ",
+    "republica checa": "CZ", "germany": "DE", "alemania": "DE", "denmark": "DK", "dinamarca": "DK",
+    "dominican republic": "DO", "republica dominicana": "DO", "algeria": "DZ", "argelia": "DZ",
+    "ecuador": "EC", "estonia": "EE", "egypt": "EG", "egipto": "EG", "spain": "ES", "espana": "ES",
+    "finland": "FI", "finlandia": "FI", "france": "FR", "francia": "FR", "united kingdom": "GB",
+    "reino unido": "GB", "great britain": "GB", "uk": "GB", "georgia": "GE", "greece": "GR", "grecia": "GR",
+    "guatemala": "GT", "hong kong": "HK", "croatia": "HR", "croacia": "HR", "hungary": "HU", "hungria": "HU",
+    "indonesia": "ID", "ireland": "IE", "irlanda": "IE", "israel": "IL", "india": "IN", "iraq": "IQ",
+    "iran": "IR", "iceland": "IS", "islandia": "IS", "italy": "IT", "italia": "IT", "jordan": "JO",
+    "jordania": "JO", "japan": "JP", "japon": "JP", "kenya": "KE", "south korea": "KR", "korea": "KR",
+    "republic of korea": "KR", "corea del sur": "KR", "kuwait": "KW", "kazakhstan": "KZ", "lebanon": "LB",
+    "libano": "LB", "liechtenstein": "LI", "sri lanka": "LK", "lithuania": "LT", "lituania": "LT",
+    "luxembourg": "LU", "luxemburgo": "LU", "latvia": "LV", "letonia": "LV", "morocco": "MA",
+    "marruecos": "MA", "monaco": "MC", "moldova": "MD", "montenegro": "ME", "north macedonia": "MK",
+    "macao": "MO", "macau": "MO", "malta": "MT", "mexico": "MX", "malaysia": "MY", "malasia": "MY",
+    "nigeria": "NG", "netherlands": "NL", "the netherlands": "NL", "holland": "NL", "paises bajos": "NL",
+    "norway": "NO", "noruega": "NO", "new zealand": "NZ", "nueva zelanda": "NZ", "oman": "OM",
+    "panama": "PA", "peru": "PE", "philippines": "PH", "filipinas": "PH", "pakistan": "PK", "poland": "PL",
+    "polonia": "PL", "portugal": "PT", "paraguay": "PY", "qatar": "QA", "catar": "QA", "romania": "RO",
+    "rumania": "RO", "serbia": "RS", "russia": "RU", "russian federation": "RU", "rusia": "RU",
+    "saudi arabia": "SA", "arabia saudi": "SA", "arabia saudita": "SA", "sweden": "SE", "suecia": "SE",
+    "singapore": "SG", "singapur": "SG", "slovenia": "SI", "eslovenia": "SI", "slovakia": "SK",
+    "eslovaquia": "SK", "san marino": "SM", "el salvador": "SV", "thailand": "TH", "tailandia": "TH",
+    "tunisia": "TN", "tunez": "TN", "turkey": "TR", "turkiye": "TR", "turquia": "TR", "taiwan": "TW",
+    "ukraine": "UA", "ucrania": "UA", "united states": "US", "united states of america": "US", "usa": "US",
+    "estados unidos": "US", "uruguay": "UY", "uzbekistan": "UZ", "venezuela": "VE", "vietnam": "VN",
+    "viet nam": "VN", "south africa": "ZA", "sudafrica": "ZA",
+}
+
+_ACCENTS = str.maketrans("áéíóúüñç", "aeiouunc")
+
+
+@lru_cache(maxsize=1024)
+def get_country_calling_code(country: Optional[str]) -> Optional[str]:
+    if not country:
+        return None
+    key: str = country.strip().lower().translate(_ACCENTS)
+    return COUNTRY_CALLING_CODES.get(key.upper()) or COUNTRY_CALLING_CODES.get(COUNTRY_NAMES.get(key, ""))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_phone_number(
+        phone_number: Optional[str], country: Optional[str] = None, default_calling_code: str = DEFAULT_CALLING_CODE
+) -> Optional[str]:
+    if not phone_number:
+        return None
+    digits: str = "".join(ch for ch in phone_number if ch.isdigit())
+    if not digits:
+        return None
+
+    if phone_number.lstrip().startswith("+") or digits.startswith("00"):
+        number: str = digits.lstrip("0")
+    else:
+        calling_code: str = get_country_calling_code(country) or default_calling_code
+        national_number: str = digits if calling_code in KEEP_LEADING_ZERO_CALLING_CODES else digits.lstrip("0")
+        max_length: int = NATIONAL_NUMBER_MAX_LENGTHS.get(calling_code, NATIONAL_NUMBER_MAX_LENGTH)
+        number: str = national_number if len(national_number) > max_length else calling_code + national_number
+
+    return number if MIN_NUMBER_LENGTH <= len(number) <= MAX_NUMBER_LENGTH else None
+
+
+def normalize_phone_numbers(
+        phone_numbers: Iterable[Optional[str]],
+        country: Optional[str] = None,
+        default_calling_code: str = DEFAULT_CALLING_CODE,
+) -> List[str]:
+    # Spellings of the same number collapse into one entry, the first occurrence keeps its place
+    normalized: dict = {}
+    for phone_number in phone_numbers:
+        number: Optional[str] = normalize_phone_number(phone_number, country, default_calling_code)
+        if number:
+            normalized.setdefault(number, None)
+    return list(normalized)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def recreate_phone_number(phone_number: Optional[str]) -> Optional[str]:
+    if not phone_number:
+        return None
+    digits: str = "".join(ch for ch in phone_number if ch.isdigit()).lstrip("0")
+    if not digits:
+        return None
+    return digits if PHONE_NUMBER_PATTERN.search(digits) and len(digits) <= 13 else None
+
+
+def validate_phone_number(phone_number: str) -> bool:
+    if not phone_number or any(ch.isalpha() for ch in phone_number):
+        return False
+    return recreate_phone_number(phone_number) is not None
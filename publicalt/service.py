@@ -1,56 +1,73 @@
-import asyncio
-from typing import List, Tuple
+from functools import partial
+from typing import AsyncIterator, Dict, List, Tuple, Optional
 
-import requests
-from requests import Response
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
+from phone_numbers import normalize_phone_number
 from services import WhatsappService
+from tools import ContactCrawler
 
 
 class PublicaltParseService(AbstractParseService):
     Publicalt_URL: str = "https://publicalt.xeria.es/"
     DEFAULT_COUNTRY_PHONE_CODE: str = "34"
 
-    def __init__(self, catalog_name: str, whatsapp: WhatsappService):
+    def __init__(
+            self,
+            catalog_name: str,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+    ):
         self.catalog_name: str = catalog_name
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
         return "Name", "Website", "Email", "Phone number", "Whatsapp Link", "Country", "Detail Link"
 
-    def __format_phone_number(self, phone_number: str) -> str:
-        if not phone_number:
-            return phone_number
+    def __format_phone_number(self, phone_number: str, country: Optional[str] = None) -> Optional[str]:
+        return normalize_phone_number(phone_number, country, self.DEFAULT_COUNTRY_PHONE_CODE)
 
-        # +(xxx or xx) xx xxx-xx-xx !!! min 11 chars
-        phone_number: str = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-
-        return self.DEFAULT_COUNTRY_PHONE_CODE + phone_number if not 11 <= len(phone_number) else phone_number
-
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
         return [
-            [
-                exhibitor["Name"],
-                exhibitor["Web"],
-                exhibitor["Email"],
-                exhibitor["Telephone"],
-                await self.whatsapp.format_to_whatsapp_link(self.__format_phone_number(exhibitor["Telephone"])),
-                exhibitor["Country"],
-                self.Publicalt_URL + f"{self.catalog_name}/es/company/Details/" + str(exhibitor["IdAccount"]),
-            ] for exhibitor in exhibitors
+            exhibitor["Name"],
+            exhibitor["Web"],
+            exhibitor["Email"],
+            exhibitor["Telephone"],
+            await self.whatsapp.format_to_whatsapp_link(
+                self.__format_phone_number(exhibitor["Telephone"], exhibitor["Country"])
+            ),
+            exhibitor["Country"],
+            self.Publicalt_URL + f"{self.catalog_name}/es/company/Details/" + str(exhibitor["IdAccount"]),
         ]
 
-    async def __parse_exhibitors(self) -> List:
+    async def __parse_page(self) -> List:
         url: str = self.Publicalt_URL + f"{self.catalog_name}/es/Company/Companies_Read"
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-        request: Response = await asyncio.to_thread(requests.post, url=url, data="sort=Name-asc", headers=headers)
-        return await self.__format_exhibitors_data(request.json()["Data"]) if request.status_code == 200 else []
+        request: HttpResponse = await self.client.post(url, data="sort=Name-asc", headers=headers, stage="listing")
+        return request.json()["Data"] if request.status_code == 200 else []
+
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        exhibitors: List = await self._checkpoint("page", 0, self.__parse_page)
+        async for exhibitor in self._yield_as_completed(
+                self._checkpoint("row", exhibitor["IdAccount"], partial(self.__format_exhibitor_data, exhibitor))
+                for exhibitor in exhibitors
+        ):
+            yield exhibitor
 
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
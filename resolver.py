@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import AsyncResolver, ThreadedResolver
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+
+class CachingResolver(AbstractResolver):
+    TTL: float = 5 * 60
+    # Exhibitor domains that are gone stay gone for the length of a run
+    NEGATIVE_TTL: float = 60 * 60
+    MAX_CONCURRENT_LOOKUPS: int = 50
+
+    def __init__(
+            self,
+            resolver: Optional[AbstractResolver] = None,
+            nameservers: Optional[List[str]] = None,
+            ttl: float = TTL,
+            negative_ttl: float = NEGATIVE_TTL,
+            max_concurrent_lookups: int = MAX_CONCURRENT_LOOKUPS,
+    ):
+        self.ttl: float = ttl
+        self.negative_ttl: float = negative_ttl
+        self.__resolver: AbstractResolver = resolver or self.create_resolver(nameservers)
+        self.__addresses: Dict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]] = {}
+        self.__unresolvable: Dict[str, float] = {}
+        self.__in_flight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.__lookups = asyncio.Semaphore(max_concurrent_lookups)
+        self.__warm_ups: Set[asyncio.Future] = set()
+
+    @staticmethod
+    def create_resolver(nameservers: Optional[List[str]] = None) -> AbstractResolver:
+        # aiodns ships with requirements.txt, an install without it still works but every lookup is then
+        # a blocking getaddrinfo call in the default thread pool
+        if aiodns is not None:
+            return AsyncResolver(nameservers=nameservers) if nameservers else AsyncResolver()
+        if nameservers:
+            raise RuntimeError("aiodns is required to query custom nameservers, install it or drop the nameservers")
+        return ThreadedResolver()
+
+    @staticmethod
+    def get_host(url: str) -> Optional[str]:
+        # Listings often drop the scheme, "example.com/about" still names a host
+        host: Optional[str] = urlsplit(url if "//" in url else "//" + url).hostname
+        return host.rstrip(".") if host else None
+
+    @staticmethod
+    def is_not_found(exc: OSError) -> bool:
+        # Only a definite "no such domain" is cached, a timeout or SERVFAIL says nothing about the domain.
+        # AsyncResolver turns every aiodns error into a bare OSError, the aiodns status is left on its cause
+        if isinstance(exc, socket.gaierror):
+            return exc.errno == socket.EAI_NONAME
+        cause: Optional[BaseException] = exc.__cause__
+        return (
+            aiodns is not None and isinstance(cause, aiodns.error.DNSError)
+            and bool(cause.args) and cause.args[0] == aiodns.error.ARES_ENOTFOUND
+        )
+
+    def is_unresolvable(self, host: Optional[str]) -> bool:
+        if not host:
+            return False
+        expires_at: Optional[float] = self.__unresolvable.get(host)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    async def __lookup(self, host: str, family: int) -> List[Dict[str, Any]]:
+        async with self.__lookups:
+            try:
+                addresses: List[Dict[str, Any]] = await self.__resolver.resolve(host, 0, family)
+            except OSError as exc:
+                if self.is_not_found(exc):
+                    self.__unresolvable[host] = time.monotonic() + self.negative_ttl
+                raise
+        self.__addresses[(host, family)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def resolve(
+            self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET
+    ) -> List[Dict[str, Any]]:
+        if self.is_unresolvable(host):
+            raise OSError(f"Domain name not found: {host}")
+
+        key: Tuple[str, int] = (host, family)
+        cached: Optional[Tuple[float, List[Dict[str, Any]]]] = self.__addresses.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            addresses: List[Dict[str, Any]] = cached[1]
+        else:
+            # The warm-up and the first connection to a host share one lookup
+            if key not in self.__in_flight:
+                future: asyncio.Future = asyncio.ensure_future(self.__lookup(host, family))
+                future.add_done_callback(lambda _: self.__in_flight.pop(key, None))
+                self.__in_flight[key] = future
+            addresses = await asyncio.shield(self.__in_flight[key])
+        # Lookups are cached without a port, http and https connections to a host reuse the same answer
+        return [address | {"port": port} for address in addresses]
+
+    async def __warm_up(self, hosts: Iterable[str]) -> None:
+        await asyncio.gather(*[self.resolve(host, family=socket.AF_UNSPEC) for host in hosts], return_exceptions=True)
+
+    def warm_up(self, urls: Iterable[Optional[str]]) -> None:
+        hosts: Set[str] = {host for host in (self.get_host(url) for url in urls if isinstance(url, str)) if host}
+        if not hosts:
+            return
+        task: asyncio.Future = asyncio.ensure_future(self.__warm_up(hosts))
+        task.add_done_callback(self.__warm_ups.discard)
+        self.__warm_ups.add(task)
+
+    async def close(self) -> None:
+        for task in self.__warm_ups:
+            task.cancel()
+        await self.__resolver.close()
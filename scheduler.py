@@ -0,0 +1,115 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+
+class HostLimit(NamedTuple):
+    concurrency: int
+    requests_per_second: Optional[float] = None
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else max(rate, 1.0)
+        self.__tokens: float = self.capacity
+        self.__updated_at: Optional[float] = None
+        self.__lock = asyncio.Lock()
+
+    def __refill(self, now: float) -> None:
+        if self.__updated_at is not None:
+            self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated_at) * self.rate)
+        self.__updated_at = now
+
+    async def take(self) -> None:
+        # The lock keeps waiters in FIFO order, so a busy host drains its budget evenly
+        async with self.__lock:
+            loop = asyncio.get_running_loop()
+            self.__refill(loop.time())
+            while self.__tokens < 1:
+                await asyncio.sleep((1 - self.__tokens) / self.rate)
+                self.__refill(loop.time())
+            self.__tokens -= 1
+
+
+class _HostState(object):
+    def __init__(self, limit: HostLimit):
+        self.semaphore = asyncio.Semaphore(limit.concurrency)
+        self.bucket: Optional[TokenBucket] = (
+            TokenBucket(limit.requests_per_second) if limit.requests_per_second else None
+        )
+
+
+class RequestScheduler(object):
+    MAX_CONCURRENCY: int = 100
+    DEFAULT_HOST_LIMIT: HostLimit = HostLimit(concurrency=10)
+
+    def __init__(
+            self,
+            max_concurrency: int = MAX_CONCURRENCY,
+            default_host_limit: HostLimit = DEFAULT_HOST_LIMIT,
+            host_limits: Optional[Dict[str, HostLimit]] = None,
+    ):
+        self.max_concurrency: int = max_concurrency
+        self.default_host_limit: HostLimit = default_host_limit
+        self.host_limits: Dict[str, HostLimit] = host_limits or {}
+        self.__hosts: Dict[str, _HostState] = {}
+        self.__active: int = 0
+        self.__waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self.__hosts_order: Deque[str] = deque()
+
+    def __get_host_state(self, host: str) -> _HostState:
+        if host not in self.__hosts:
+            self.__hosts[host] = _HostState(self.host_limits.get(host, self.default_host_limit))
+        return self.__hosts[host]
+
+    def __dispatch(self) -> None:
+        # Hand out free global slots round-robin across hosts, so one big catalog cannot starve the others
+        while self.__active < self.max_concurrency and self.__hosts_order:
+            host: str = self.__hosts_order.popleft()
+            waiters: Deque[asyncio.Future] = self.__waiters[host]
+            waiter: asyncio.Future = waiters.popleft()
+            if waiters:
+                self.__hosts_order.append(host)
+            else:
+                del self.__waiters[host]
+            if waiter.done():
+                continue
+            waiter.set_result(None)
+            self.__active += 1
+
+    async def __acquire(self, host: str) -> None:
+        if self.__active < self.max_concurrency and not self.__hosts_order:
+            self.__active += 1
+            return
+
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        if host not in self.__waiters:
+            self.__waiters[host] = deque()
+            self.__hosts_order.append(host)
+        self.__waiters[host].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.__release()
+            raise
+
+    def __release(self) -> None:
+        self.__active -= 1
+        self.__dispatch()
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host: str = urlsplit(url).hostname or ""
+        host_state: _HostState = self.__get_host_state(host)
+        async with host_state.semaphore:
+            if host_state.bucket is not None:
+                await host_state.bucket.take()
+            await self.__acquire(host)
+            try:
+                yield
+            finally:
+                self.__release()
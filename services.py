@@ -1,34 +1,100 @@
 import asyncio
 import json
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 
-import requests
-from requests import Response
+import aiohttp
 
-
-I_PARAM: int = 0
+from cache import WhatsappCache
+from http_client import HttpClient, HttpResponse
+from scheduler import TokenBucket
 
 
 class WhatsappService(object):
     Green_API_URL: str = "https://api.green-api.com/"
+    MAX_CONCURRENT_CHECKS: int = 10
+    REQUESTS_PER_SECOND: float = 10
+    MAX_RETRIES: int = 5
 
-    def __init__(self, id_instance: int, api_token_instance: str):
+    def __init__(
+            self,
+            id_instance: int,
+            api_token_instance: str,
+            client: HttpClient,
+            cache: Optional[WhatsappCache] = None,
+            max_concurrent_checks: int = MAX_CONCURRENT_CHECKS,
+            requests_per_second: Optional[float] = REQUESTS_PER_SECOND,
+            max_retries: int = MAX_RETRIES,
+    ):
         self.id_instance = id_instance
         self.api_token_instance = api_token_instance
+        self.client = client
+        self.cache = cache
+        self.__in_flight: Dict[str, asyncio.Future] = {}
+        self.__semaphore = asyncio.Semaphore(max_concurrent_checks)
+        self.max_retries: int = max_retries
+        # No rate means no throttling, replaying a capture never reaches Green API
+        self.__bucket: Optional[TokenBucket] = TokenBucket(requests_per_second) if requests_per_second else None
+
+    async def __check_whatsapp(self, phone_number: str) -> Optional[bool]:
+        url = self.Green_API_URL + f"waInstance{self.id_instance}/checkWhatsapp/{self.api_token_instance}"
+        data = {"phoneNumber": phone_number}
+        headers = {"Content-Type": "application/json"}
+
+        try:
+            async with self.__semaphore:
+                if self.__bucket is not None:
+                    await self.__bucket.take()
+                r: HttpResponse = await self.client.post(
+                    url, data=json.dumps(data), headers=headers, stage="whatsapp", retries=self.max_retries
+                )
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            # One network blip leaves this number unknown and uncached, it must not fail the whole row
+            return None
+        if r.status_code != 200:
+            return None
+
+        exists_whatsapp: bool = bool(r.json()["existsWhatsapp"])
+        if self.cache is not None:
+            self.cache.set(phone_number, exists_whatsapp)
+        return exists_whatsapp
+
+    async def __exists_whatsapp(self, phone_number: str) -> Optional[bool]:
+        if self.cache is not None:
+            exists_whatsapp: Optional[bool] = self.cache.get(phone_number)
+            if exists_whatsapp is not None:
+                return exists_whatsapp
+
+        # Concurrent lookups of the same number share a single Green API call
+        if phone_number not in self.__in_flight:
+            future: asyncio.Future = asyncio.ensure_future(self.__check_whatsapp(phone_number))
+            future.add_done_callback(lambda _: self.__in_flight.pop(phone_number, None))
+            self.__in_flight[phone_number] = future
+        return await asyncio.shield(self.__in_flight[phone_number])
+
+    def close(self) -> None:
+        # Shared checks outlive the rows that asked for them, a failed run must not leave them calling Green API
+        for future in list(self.__in_flight.values()):
+            future.cancel()
+        self.__in_flight.clear()
 
     async def format_to_whatsapp_link(self, phone_number: str) -> Optional[str]:
-        global I_PARAM
-        I_PARAM += 1
         if not phone_number or not phone_number.isdigit():
             return None
 
         phone_number = str(int(phone_number))
+        return f"https://wa.me/{phone_number}" if await self.__exists_whatsapp(phone_number) else None
 
-        print(f"{I_PARAM}. Working with {phone_number}")
+    async def format_to_whatsapp_links(
+            self, phone_numbers: List[Optional[str]], progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[Optional[str]]:
+        done: int = 0
 
-        url = self.Green_API_URL + f"waInstance{self.id_instance}/checkWhatsapp/{self.api_token_instance}"
-        data = {"phoneNumber": phone_number}
-        headers = {"Content-Type": "application/json"}
+        async def format_with_progress(phone_number: Optional[str]) -> Optional[str]:
+            nonlocal done
+            whatsapp_link: Optional[str] = await self.format_to_whatsapp_link(phone_number)
+            done += 1
+            if progress is not None:
+                progress(done, len(phone_numbers))
+            return whatsapp_link
 
-        r: Response = await asyncio.to_thread(requests.post, url=url, data=json.dumps(data), headers=headers)
-        return f"https://wa.me/{phone_number}" if r.status_code == 200 and r.json()["existsWhatsapp"] else None
+        return list(await asyncio.gather(*[format_with_progress(phone_number) for phone_number in phone_numbers]))
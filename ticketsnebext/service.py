@@ -1,21 +1,36 @@
 import asyncio
-from typing import Tuple, List, Dict
+from functools import partial
+from typing import AsyncIterator, Tuple, List, Dict, Optional
 
-import requests
-from requests import Response
 
 from abstract import AbstractParseService
+from cache import ExhibitorIndex
+from checkpoint import CheckpointStore
+from http_client import HttpClient, HttpResponse
+from phone_numbers import normalize_phone_number
 from services import WhatsappService
-from tools import parsing_emails_from_website
+from tools import ContactCrawler, parsing_emails_from_website
 
 
 class TicketsNebextParseService(AbstractParseService):
     TicketsNebext_API_URL: str = "https://des.ticketsnebext.com"
     DEFAULT_COUNTRY_PHONE_CODE: str = "34"
 
-    def __init__(self, catalog_name: str, whatsapp: WhatsappService):
+    def __init__(
+            self,
+            catalog_name: str,
+            whatsapp: WhatsappService,
+            client: HttpClient,
+            checkpoint: Optional[CheckpointStore] = None,
+            index: Optional[ExhibitorIndex] = None,
+            crawler: Optional[ContactCrawler] = None,
+    ):
         self.catalog_name: str = catalog_name
         self.whatsapp = whatsapp
+        self.client = client
+        self.checkpoint = checkpoint
+        self.index = index
+        self.crawler = crawler
 
     @staticmethod
     def __get_parsed_data_names() -> Tuple:
@@ -24,14 +39,8 @@ class TicketsNebextParseService(AbstractParseService):
     def __get_detail_exhibitor_web_link(self, exhibitor_id: int) -> str:
         return self.TicketsNebext_API_URL + f"/{self.catalog_name}/en/Company/Details/{exhibitor_id}"
 
-    def __format_phone_number(self, phone_number: str) -> str:
-        if not phone_number:
-            return phone_number
-
-        # +(xxx or xx) xx xxx-xx-xx !!! min 11 chars
-        phone_number: str = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-
-        return self.DEFAULT_COUNTRY_PHONE_CODE + phone_number if not 11 <= len(phone_number) else phone_number
+    def __format_phone_number(self, phone_number: str, country: Optional[str] = None) -> Optional[str]:
+        return normalize_phone_number(phone_number, country, self.DEFAULT_COUNTRY_PHONE_CODE)
 
     @staticmethod
     def __format_website(url: str) -> str:
@@ -39,34 +48,41 @@ class TicketsNebextParseService(AbstractParseService):
             return url
         return url if url[:8] == "https://" or url[:7] == "http://" else "https://" + url
 
-    async def __format_exhibitors_data(self, exhibitors: List) -> List:
-        exhibitors = [
-            exhibitor | {
-                "Emails": asyncio.create_task(parsing_emails_from_website(self.__format_website(exhibitor["Web"])))
-            } for exhibitor in exhibitors
-        ]
+    async def __format_exhibitor_data(self, exhibitor: Dict) -> List:
+        emails: asyncio.Task = asyncio.create_task(
+            parsing_emails_from_website(self.client, self.__format_website(exhibitor["Web"]), self.index, self.crawler)
+        )
         return [
-            [
-                exhibitor["Name"],
-                exhibitor["Country"],
-                await self.whatsapp.format_to_whatsapp_link(self.__format_phone_number(exhibitor["Telephone"])),
-                exhibitor["Telephone"],
-                exhibitor["Email"],
-                await exhibitor["Emails"],
-                self.__format_website(exhibitor["Web"]),
-                self.__get_detail_exhibitor_web_link(exhibitor["IdAccount"]),
-            ] for exhibitor in exhibitors
+            exhibitor["Name"],
+            exhibitor["Country"],
+            await self.whatsapp.format_to_whatsapp_link(
+                self.__format_phone_number(exhibitor["Telephone"], exhibitor["Country"])
+            ),
+            exhibitor["Telephone"],
+            exhibitor["Email"],
+            await emails,
+            self.__format_website(exhibitor["Web"]),
+            self.__get_detail_exhibitor_web_link(exhibitor["IdAccount"]),
         ]
 
-    async def __parse_exhibitors(self) -> List:
+    async def __parse_page(self) -> List:
         url: str = self.TicketsNebext_API_URL + f"/{self.catalog_name}/en/Company/Companies_Read"
         data: dict = {"sort": "corder-asc~Name-asc"}
 
-        request: Response = await asyncio.to_thread(requests.post, url=url, data=data)
-        return await self.__format_exhibitors_data(request.json()["Data"]) if request.status_code == 200 else []
+        request: HttpResponse = await self.client.post(url, data=data, stage="listing")
+        return request.json()["Data"] if request.status_code == 200 else []
+
+    async def __parse_exhibitors(self) -> AsyncIterator[List]:
+        exhibitors: List = await self._checkpoint("page", 0, self.__parse_page)
+        self.client.warm_up(self.__format_website(exhibitor["Web"]) for exhibitor in exhibitors)
+        async for exhibitor in self._yield_as_completed(
+                self._checkpoint("row", exhibitor["IdAccount"], partial(self.__format_exhibitor_data, exhibitor))
+                for exhibitor in exhibitors
+        ):
+            yield exhibitor
 
-    async def parse(self) -> List:
-        return await self.__parse_exhibitors()
+    def stream(self) -> AsyncIterator[List]:
+        return self.__parse_exhibitors()
 
     def get_parsed_data_names(self) -> Tuple:
         return self.__get_parsed_data_names()
@@ -1,58 +1,198 @@
 import asyncio
 import re
-from typing import List, Optional
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
 
-import requests
-from bs4 import BeautifulSoup
-from requests import Response, exceptions
-from requests.exceptions import InvalidURL
-from urllib3.exceptions import LocationParseError
+import aiohttp
 
+from cache import ExhibitorIndex
+from extractors import CONTACT_EXTRACTORS, extract_contacts, extract_contacts_and_links
+from http_client import HttpClient, HttpResponse
+from parsing_pool import parse_in_pool
 
-async def parsing_emails_from_website(url: str) -> List:
-    print(f"Parse Website email {url}")
-    try:
-        request: Response = await asyncio.to_thread(requests.get, url=url, timeout=3)
-    except Exception as exc:
-        print(exc)
-        return []
-    print(f"Stop Parse Website {url}")
-    soup = BeautifulSoup(request.content, "lxml")
-    email_pattern = re.compile(r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4})")
-    return list(set(re.findall(email_pattern, soup.get_text()))) if request.status_code == 200 else []
-
-
-async def parsing_phone_numbers_from_website(url: str) -> List:
-    print(f"Parse Website phone {url}")
-    try:
-        request: Response = await asyncio.to_thread(requests.get, url=url)
-    except:
-        return []
-    print(f"Stop Parse Website {url}")
-    soup = BeautifulSoup(request.content, "lxml")
-    phone_pattern = re.compile(r"\+?\d{1,3}\s?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{2}[-.\s]?\d{2}")
-    return list(set(re.findall(phone_pattern, soup.get_text()))) if request.status_code == 200 else []
+
+# Connect and total deadlines apply to every website, a slow or trickling site cannot hold a row back
+WEBSITE_TIMEOUT = aiohttp.ClientTimeout(total=3, connect=2)
+WEBSITE_MAX_BYTES: int = 2 * 1024 * 1024
+WEBSITE_CONTENT_TYPES: Tuple[str, ...] = ("text/html", "application/xhtml+xml", "text/plain")
+EMAIL_ADDRESS_PATTERN = re.compile(r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4})")
+
+# Lookups in flight per client, so they end with the run that owns the client and its index
+_IN_FLIGHT_WEBSITES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
 
-def recreate_phone_number(phone_number: str) -> Optional[str]:
-    if not phone_number or not any(ch.isdigit() for ch in phone_number):
+async def _fetch_website(client: HttpClient, url: str) -> Optional[HttpResponse]:
+    try:
+        request: HttpResponse = await client.get(
+            url,
+            timeout=WEBSITE_TIMEOUT,
+            stage="website",
+            max_bytes=WEBSITE_MAX_BYTES,
+            content_types=WEBSITE_CONTENT_TYPES,
+        )
+    except Exception:
         return None
-    new_phone = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-    return new_phone if validate_phone_number(new_phone) else None
+    return request if request.status_code == 200 else None
 
 
-def validate_phone_number(phone_number: str) -> bool:
+class ContactCrawler(object):
+    MAX_PAGES: int = 4
+    MAX_CONCURRENT_PAGES: int = 2
+    FIELDS: Tuple[str, ...] = ("emails",)
+    # A link scores its best keyword found in its path or anchor text, higher scores are fetched first
+    LINK_KEYWORDS: Dict[str, int] = {
+        "contact": 4, "kontakt": 4, "contacto": 4, "contatti": 4, "contato": 4,
+        "impressum": 3, "imprint": 3, "aviso-legal": 3, "aviso legal": 3, "mentions-legales": 3,
+        "legal": 2, "privacy": 1, "about": 1, "ueber-uns": 1, "uber-uns": 1, "quienes-somos": 1, "nosotros": 1,
+        "empresa": 1, "company": 1,
+    }
+    SKIPPED_EXTENSIONS: Tuple[str, ...] = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".zip", ".doc", ".docx")
 
-    if not phone_number or not any(ch.isdigit() for ch in phone_number) or any(ch.isalpha() for ch in phone_number):
-        return False
-    phone_number: str = str(int("".join(ch for ch in phone_number if ch.isdigit())))
-    pattern = re.compile(r"(\+\d{1,3})?\s?\(?\d{1,4}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
-    return True if re.search(pattern, phone_number) and len(phone_number) <= 13 else False
+    def __init__(
+            self,
+            max_pages: int = MAX_PAGES,
+            max_concurrent_pages: int = MAX_CONCURRENT_PAGES,
+            fields: Iterable[str] = FIELDS,
+    ):
+        self.max_pages: int = max_pages
+        self.max_concurrent_pages: int = max_concurrent_pages
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.__domains: Dict[str, asyncio.Semaphore] = {}
+
+    @staticmethod
+    def get_domain(url: str) -> str:
+        host: str = (urlsplit(url).hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def is_complete(self, contacts: Dict[str, List]) -> bool:
+        return all(contacts.get(field) for field in self.fields)
+
+    def is_covered(self, crawled_fields: Iterable[str]) -> bool:
+        return set(self.fields) <= set(crawled_fields)
+
+    def rank_links(self, url: str, links: Iterable[Tuple[str, str]]) -> List[str]:
+        domain: str = self.get_domain(url)
+        scores: Dict[str, int] = {}
+        for href, text in links:
+            link = urlsplit(urljoin(url, href))._replace(fragment="")
+            if link.scheme not in ("http", "https") or self.get_domain(link.geturl()) != domain:
+                continue
+            if link.path.lower().endswith(self.SKIPPED_EXTENSIONS) or link.geturl().rstrip("/") == url.rstrip("/"):
+                continue
+            haystack: str = f"{link.path} {text}".lower()
+            score: int = max((score for keyword, score in self.LINK_KEYWORDS.items() if keyword in haystack), default=0)
+            if score > scores.get(link.geturl(), 0):
+                scores[link.geturl()] = score
+        # On a tie the shorter url wins, /contact is a better bet than /blog/contact-us-for-a-quote
+        return sorted(scores, key=lambda link: (-scores[link], len(link)))[:max(self.max_pages - 1, 0)]
+
+    def __get_semaphore(self, url: str) -> asyncio.Semaphore:
+        domain: str = self.get_domain(url)
+        if domain not in self.__domains:
+            self.__domains[domain] = asyncio.Semaphore(self.max_concurrent_pages)
+        return self.__domains[domain]
+
+    @staticmethod
+    async def __fetch(client: HttpClient, url: str, parse: Callable[[bytes], Any]) -> Optional[Tuple[Any, str]]:
+        request: Optional[HttpResponse] = await _fetch_website(client, url)
+        if request is None:
+            return None
+        return await parse_in_pool(parse, request.content), request.url
+
+    async def crawl(self, client: HttpClient, url: str) -> Optional[Dict[str, List]]:
+        # Listings hand over a missing website as None or NaN
+        if not isinstance(url, str):
+            return None
+        async with self.__get_semaphore(url):
+            homepage: Optional[Tuple[Any, str]] = await self.__fetch(client, url, extract_contacts_and_links)
+        if homepage is None:
+            return None
+        (contacts, links), homepage_url = homepage
+        if self.is_complete(contacts):
+            return contacts
+
+        async def fetch_page(link: str) -> None:
+            nonlocal contacts
+            async with self.__get_semaphore(link):
+                # Pages still queued behind the domain limit are never requested once the fields are found
+                if self.is_complete(contacts):
+                    return
+                page: Optional[Tuple[Any, str]] = await self.__fetch(client, link, extract_contacts)
+                if page is not None:
+                    contacts = {name: list(dict.fromkeys(values + page[0][name])) for name, values in contacts.items()}
+
+        tasks: list = [asyncio.ensure_future(fetch_page(link)) for link in self.rank_links(homepage_url, links)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                await task
+                if self.is_complete(contacts):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+        return contacts
+
+
+async def _parsing_contacts_from_website(
+        client: HttpClient, url: str, index: Optional[ExhibitorIndex] = None, crawler: Optional[ContactCrawler] = None
+) -> Dict[str, List]:
+    if crawler is not None:
+        contacts: Optional[Dict[str, List]] = await crawler.crawl(client, url)
+    else:
+        request: Optional[HttpResponse] = await _fetch_website(client, url)
+        contacts: Optional[Dict[str, List]] = (
+            await parse_in_pool(extract_contacts, request.content) if request is not None else None
+        )
+    if contacts is None:
+        return {name: [] for name in CONTACT_EXTRACTORS}
+
+    # Only pages that were actually read are indexed, failed fetches are retried next time
+    if index is not None:
+        index.set_contacts(url, contacts, crawler.fields if crawler is not None else ())
+    return contacts
+
+
+async def parsing_contacts_from_website(
+        client: HttpClient, url: str, index: Optional[ExhibitorIndex] = None, crawler: Optional[ContactCrawler] = None
+) -> Dict[str, List]:
+    if index is not None:
+        entry: Optional[Tuple[Dict[str, List], List[str]]] = index.get_entry(url)
+        # An incomplete entry the crawler has not searched yet, such as a homepage-only lookup, is a miss
+        if entry is not None and (crawler is None or crawler.is_complete(entry[0]) or crawler.is_covered(entry[1])):
+            return entry[0]
+
+    # Exhibitors of the same run often share a website, download and parse it only once.
+    # A crawl and a homepage-only lookup of the same url are different results
+    in_flight: Dict[Tuple, asyncio.Future] = _IN_FLIGHT_WEBSITES.setdefault(client, {})
+    key: Tuple = (url, index, crawler)
+    if key not in in_flight:
+        future: asyncio.Future = asyncio.ensure_future(_parsing_contacts_from_website(client, url, index, crawler))
+        future.add_done_callback(lambda _: in_flight.pop(key, None))
+        in_flight[key] = future
+    return await asyncio.shield(in_flight[key])
+
+
+def cancel_website_lookups(client: HttpClient) -> None:
+    # Shielded lookups outlive the rows that asked for them, none may write to an index closed after the run
+    for future in list(_IN_FLIGHT_WEBSITES.pop(client, {}).values()):
+        future.cancel()
+
+
+async def parsing_emails_from_website(
+        client: HttpClient, url: str, index: Optional[ExhibitorIndex] = None, crawler: Optional[ContactCrawler] = None
+) -> List:
+    return (await parsing_contacts_from_website(client, url, index, crawler))["emails"]
+
+
+async def parsing_phone_numbers_from_website(
+        client: HttpClient, url: str, index: Optional[ExhibitorIndex] = None, crawler: Optional[ContactCrawler] = None
+) -> List:
+    return (await parsing_contacts_from_website(client, url, index, crawler))["phones"]
 
 
 def validate_email(email: str) -> bool:
     if not email:
         return False
 
-    pattern = re.compile(r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4})")
-    return True if re.search(pattern, email) else False
+    return True if EMAIL_ADDRESS_PATTERN.search(email) else False